@@ -0,0 +1,158 @@
+# [SUMMARY]:
+# Precomputed multi-year almanac files, memory-mapped read-only
+# One fixed-width day_table record per (location, day), stored as a location-major block
+# behind a small header. The header is a JSON index with the record dtype, first day and
+# day count, each location's name, coordinates and timezone, the tithi/nakshatra label
+# lists the codes refer to, and the providers and Ugadi date the file was built with.
+# Opening a file reads only the header and maps the records. Slicing a location's range
+# is a view into the map, so a 10-year file for hundreds of locations opens in
+# microseconds, and every worker process shares the same pages through the OS page cache.
+
+# [USAGE]:
+# write_almanac('almanac.bin', [{'name': 'Mason, OH', 'lat': 39.36, 'lon': -84.31, 'tz': 'America/New_York'}],
+#               [table], {'sun_provider': 'local', 'panchang_provider': 'local', 'ugadi_date': '2025-03-30'})
+# book = Almanac('almanac.bin')
+# entry = book.find('Mason, OH')
+# table = book.day_table(entry, '2025-01-01', '2025-12-31')  # None when the file doesn't cover the range
+# python almanac.py info almanac.bin
+
+
+import json
+import os
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from day_table import DAY_DTYPE, MISSING, NAKSHATRA_LABELS, TITHI_LABELS
+
+
+MAGIC = b'SKALMNC\x00'
+VERSION = 2  # 2: samvatsara follows each year's Ugadi
+ALIGNMENT = 64  # Records start on a 64-byte boundary
+
+
+def _descr():
+    # JSON form of the record layout, so a file built with another layout is refused
+    return json.loads(json.dumps(DAY_DTYPE.descr))
+
+
+def write_almanac(path, locations, tables, meta):
+    """Write day tables (one per location, all over the same days) as an almanac file
+
+    locations: [{'name', 'lat', 'lon', 'tz'}, ...] in the same order as tables.
+    meta: build settings kept in the header (providers, Ugadi date, ...).
+    """
+    if len(locations) != len(tables):
+        raise ValueError("One day table per location")
+    days = tables[0]['day'] if tables else np.array([], dtype='datetime64[D]')
+    for table in tables:
+        if not np.array_equal(table['day'], days):
+            raise ValueError("Every location's table must cover the same days")
+
+    header = dict(meta, **{
+        'version': VERSION,
+        'dtype': _descr(),
+        'start_date': str(days[0]) if len(days) else None,
+        'days': len(days),
+        'locations': locations,
+        'tithi_labels': TITHI_LABELS.labels,
+        'nakshatra_labels': NAKSHATRA_LABELS.labels,
+    })
+    encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    prefix = len(MAGIC) + 4 + len(encoded)
+    padding = -prefix % ALIGNMENT
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded + b'\0' * padding)
+            for table in tables:
+                f.write(np.ascontiguousarray(table, dtype=DAY_DTYPE).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return prefix + padding + len(tables) * len(days) * DAY_DTYPE.itemsize
+
+
+def _translation(file_labels, labels):
+    """Code map from a file's label list to this process's, None when the codes already agree"""
+    codes = [labels.code(label) for label in file_labels]
+    if codes == list(range(len(codes))):
+        return None
+    return np.array(codes, dtype=np.int16)
+
+
+class Almanac:
+    """Read-only view of an almanac file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an almanac file")
+            (length,) = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(length).decode('utf-8'))
+        if self.header.get('version') != VERSION or self.header.get('dtype') != _descr():
+            raise ValueError(f"{path} was written in another format; rebuild it")
+
+        self.sun_provider = self.header.get('sun_provider')
+        self.panchang_provider = self.header.get('panchang_provider')
+        self.ugadi_date = self.header.get('ugadi_date')
+        self.noon_minutes = tuple(self.header.get('noon_minutes', ()))
+        self.locations = self.header['locations']
+        self.days = self.header['days']
+        self.start = np.datetime64(self.header['start_date'], 'D') if self.days else None
+        self._index = {entry['name']: i for i, entry in enumerate(self.locations)}
+        self._tithi = _translation(self.header['tithi_labels'], TITHI_LABELS)
+        self._nakshatra = _translation(self.header['nakshatra_labels'], NAKSHATRA_LABELS)
+
+        offset = len(MAGIC) + 4 + length
+        offset += -offset % ALIGNMENT
+        self.records = None
+        if self.locations and self.days:
+            self.records = np.memmap(path, dtype=DAY_DTYPE, mode='r', offset=offset,
+                                     shape=(len(self.locations), self.days))
+
+    def find(self, name):
+        """Index of a location by the name it was built with, None when absent"""
+        return self._index.get(name)
+
+    def day_table(self, index, start_date, end_date):
+        """The location's rows for the range (a read-only view when possible), None when not covered"""
+        if self.records is None:
+            return None
+        first = (np.datetime64(str(start_date)[:10], 'D') - self.start).astype(int)
+        last = (np.datetime64(str(end_date)[:10], 'D') - self.start).astype(int)
+        if first < 0 or last >= self.days or last < first:
+            return None
+        table = self.records[index, first:last + 1]
+        if self._tithi is None and self._nakshatra is None:
+            return table
+        # Labels were coded in another order when the file was built
+        table = np.array(table)
+        for field, codes in (('tithi', self._tithi), ('nakshatra', self._nakshatra)):
+            if codes is not None:
+                found = table[field] != MISSING
+                table[field][found] = codes[table[field][found]]
+        return table
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != 'info':
+        print("Usage: python almanac.py info almanac.bin")
+        return
+    book = Almanac(sys.argv[2])
+    last = book.start + book.days - 1 if book.days else None
+    print(f"{book.path}: {len(book.locations)} locations, {book.days} days ({book.start}..{last}), "
+          f"{os.path.getsize(book.path):,} bytes")
+    print(", ".join(f"{key}: {value}" for key, value in book.header.items()
+                    if key not in ('dtype', 'locations', 'tithi_labels', 'nakshatra_labels')))
+    for entry in book.locations:
+        print(f"  {entry['name']} ({entry['lat']}, {entry['lon']}, {entry['tz']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+# [SUMMARY]:
+# Cache backends for sunrise / panchangam API results
+#
+# RunCache: run-scoped write-behind cache for the panchangam_cache/*.pkl files.
+# Each cache file is unpickled once per run and handed out as a shared dict.
+# Updates only mark the file dirty; dirty files are written every `flush_interval`
+# seconds and at exit, through a temp file + os.replace so a crash never leaves
+# a half-written pickle behind.
+#
+# SQLiteCache: one SQLite database in WAL mode, indexed by
+# (provider, rounded coordinates, date, timezone). Supports range reads,
+# "which dates are missing?" queries and concurrent writers from several processes.
+#
+# Both expose get(namespace, cache_type, key) / put(namespace, cache_type, key, value)
+# where key is the (lat, lon, date[, tz]) tuple used by the scripts, and
+# get_alias/put_alias for the table mapping typed location strings to coordinates.
+#
+# Namespaces come from coordinates + timezone (location_namespace), not from the
+# typed location, so "Mason, OH" and "Mason, Ohio" share one warm cache.
+
+# [USAGE]:
+# run_cache = RunCache("./panchangam_cache", flush_interval=30)
+# namespace = location_namespace(39.3601, -84.3099, "America/New_York")
+# run_cache.put_alias("Mason, OH", 39.3601, -84.3099, "America/New_York")
+# cache = run_cache.load(namespace, "sunrise")
+# cache[key] = data
+# run_cache.save(namespace, "sunrise", cache)
+#
+# db = SQLiteCache("./panchangam_cache/cache.sqlite3")
+# db.get_range('sunrise', 39.3601, -84.3099, '2025-01-01', '2025-12-31')
+# db.missing_days('sunrise', 39.3601, -84.3099, '2025-01-01', '2025-12-31')
+#
+# One-shot migration of the existing pickle files:
+# python cache_store.py migrate --cache-dir ./panchangam_cache --db ./panchangam_cache/cache.sqlite3
+
+
+import argparse
+import atexit
+import glob
+import json
+import os
+import pickle
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+
+FLUSH_INTERVAL = 30  # Seconds between write-behind flushes (0 = write on every save)
+COORD_SCALE = 10000  # Coordinates are keyed at 4 decimals, like the pickle cache keys
+BUSY_TIMEOUT = 30    # Seconds a writer waits for another process's lock
+GRID_MICRODEGREES = 100  # Namespace grid cell: 100 microdegrees = 1e-4 deg (~11 m)
+ALIASES_FILE = 'aliases.pkl'
+
+
+def normalize_query(query):
+    """Alias key for a typed location: case, punctuation and spacing insensitive"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', query.strip('"').lower()).split())
+
+
+def location_namespace(lat, lon, tz):
+    """Canonical cache namespace: microdegree grid cell of the coordinates plus timezone"""
+    lat_cell = int(round(lat * 1e6 / GRID_MICRODEGREES)) * GRID_MICRODEGREES
+    lon_cell = int(round(lon * 1e6 / GRID_MICRODEGREES)) * GRID_MICRODEGREES
+    return f"{lat_cell:+010d}_{lon_cell:+010d}_{tz}"
+
+
+def _sanitize(name):
+    return name.replace(' ', '_').replace(',', '').replace('/', '-')
+
+
+class RunCache:
+    """Loads each cache file once and batches writes for the whole run"""
+
+    def __init__(self, cache_dir, flush_interval=FLUSH_INTERVAL):
+        self.cache_dir = cache_dir
+        self.flush_interval = flush_interval
+        self._files = {}
+        self._dirty = set()
+        self._last_flush = time.monotonic()
+        os.makedirs(cache_dir, exist_ok=True)
+        atexit.register(self.flush)
+
+    def filename(self, namespace, cache_type):
+        """Generate sanitized cache filenames"""
+        return os.path.join(self.cache_dir, f"{_sanitize(namespace)}_{cache_type}_cache.pkl")
+
+    def legacy_filename(self, location, cache_type):
+        """Pre-namespace cache file named after the typed location string"""
+        sanitized = location.replace(' ', '_').replace(',', '')[:50]
+        return os.path.join(self.cache_dir, f"{sanitized}_{cache_type}_cache.pkl")
+
+    def _load_file(self, cache_file):
+        if cache_file not in self._files:
+            self._files[cache_file] = self._read(cache_file)
+        return self._files[cache_file]
+
+    def _mark_dirty(self, cache_file):
+        self._dirty.add(cache_file)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def load(self, namespace, cache_type):
+        """Cached dict for a namespace, read from disk only on first use"""
+        return self._load_file(self.filename(namespace, cache_type))
+
+    def get(self, namespace, cache_type, key, default=None):
+        return self.load(namespace, cache_type).get(key, default)
+
+    def put(self, namespace, cache_type, key, value):
+        cache = self.load(namespace, cache_type)
+        cache[key] = value
+        self.save(namespace, cache_type, cache)
+
+    def save(self, namespace, cache_type, data):
+        """Mark a cache dirty; it is written on the next periodic flush or at exit"""
+        cache_file = self.filename(namespace, cache_type)
+        self._files[cache_file] = data
+        self._mark_dirty(cache_file)
+
+    def get_alias(self, query):
+        """{'lat', 'lon', 'tz', 'namespace'} for a previously resolved location string"""
+        return self._load_file(os.path.join(self.cache_dir, ALIASES_FILE)).get(normalize_query(query))
+
+    def put_alias(self, query, lat, lon, tz):
+        aliases_file = os.path.join(self.cache_dir, ALIASES_FILE)
+        self._load_file(aliases_file)[normalize_query(query)] = {
+            'lat': lat, 'lon': lon, 'tz': tz, 'namespace': location_namespace(lat, lon, tz)
+        }
+        self._mark_dirty(aliases_file)
+
+    def adopt_legacy(self, location, namespace, cache_types, save=True):
+        """Merge entries of old location-named files whose coordinates fall in the namespace
+
+        save=False merges them in memory only, for dry runs that must not write files.
+        """
+        cell = '_'.join(namespace.split('_', 2)[:2]) + '_'  # Namespace without its timezone
+        for cache_type in cache_types:
+            legacy_file = self.legacy_filename(location, cache_type)
+            if legacy_file == self.filename(namespace, cache_type) or not os.path.exists(legacy_file):
+                continue
+            cache = self.load(namespace, cache_type)
+            adopted = 0
+            for key, value in self._read(legacy_file).items():
+                if key not in cache and location_namespace(key[0], key[1], '') == cell:
+                    cache[key] = value
+                    adopted += 1
+            if adopted and save:
+                print(f"Adopted {adopted} cached '{cache_type}' entries from {legacy_file}")
+                self.save(namespace, cache_type, cache)
+
+    def flush(self):
+        """Write every dirty cache file atomically"""
+        for cache_file in sorted(self._dirty):
+            self._write(cache_file, self._files[cache_file])
+        self._dirty.clear()
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def _read(cache_file):
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'rb') as f:
+                    return pickle.load(f)
+            except Exception as e:
+                print(f"Warning: Cache reset due to error: {str(e)}")
+        return {}
+
+    @staticmethod
+    def _write(cache_file, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _day_range(start_day, end_day):
+    start, end = date.fromisoformat(str(start_day)[:10]), date.fromisoformat(str(end_day)[:10])
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+class SQLiteCache:
+    """Coordinate-indexed cache in one SQLite database, safe for concurrent processes"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            provider TEXT NOT NULL,
+            lat_e4 INTEGER NOT NULL,
+            lon_e4 INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            tz TEXT NOT NULL DEFAULT '',
+            payload TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (provider, lat_e4, lon_e4, day, tz)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS aliases (
+            query TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            tz TEXT NOT NULL,
+            namespace TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._lock:
+            self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        # Connections must not cross a fork, so each process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _coords(lat, lon):
+        return int(round(lat * COORD_SCALE)), int(round(lon * COORD_SCALE))
+
+    @staticmethod
+    def _split_key(key):
+        lat, lon, day = key[:3]
+        tz = key[3] if len(key) > 3 else ''
+        return lat, lon, day, tz
+
+    def get(self, namespace, cache_type, key, default=None):
+        # Rows are already keyed by coordinates, so the namespace is not needed
+        lat, lon, day, tz = self._split_key(key)
+        value = self.get_day(cache_type, lat, lon, day, tz)
+        return default if value is None else value
+
+    def put(self, namespace, cache_type, key, value):
+        lat, lon, day, tz = self._split_key(key)
+        self.put_many(cache_type, [(lat, lon, day, tz, value)])
+
+    def get_alias(self, query):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT lat, lon, tz, namespace FROM aliases WHERE query=?", (normalize_query(query),)
+            ).fetchone()
+        return dict(zip(('lat', 'lon', 'tz', 'namespace'), row)) if row else None
+
+    def put_alias(self, query, lat, lon, tz):
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_query(query), lat, lon, tz, location_namespace(lat, lon, tz), time.time())
+            )
+
+    def adopt_legacy(self, location, namespace, cache_types, save=True):
+        """Legacy pickles are imported with 'python cache_store.py migrate' instead"""
+
+    def get_day(self, provider, lat, lon, day, tz=''):
+        lat_e4, lon_e4 = self._coords(lat, lon)
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT payload FROM entries WHERE provider=? AND lat_e4=? AND lon_e4=? AND day=? AND tz=?",
+                (provider, lat_e4, lon_e4, day, tz)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_range(self, provider, lat, lon, start_day, end_day, tz=''):
+        """All cached payloads for a date range as {day: payload}"""
+        lat_e4, lon_e4 = self._coords(lat, lon)
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT day, payload FROM entries WHERE provider=? AND lat_e4=? AND lon_e4=? "
+                "AND tz=? AND day BETWEEN ? AND ? ORDER BY day",
+                (provider, lat_e4, lon_e4, tz, str(start_day)[:10], str(end_day)[:10])
+            ).fetchall()
+        return {day: json.loads(payload) for day, payload in rows}
+
+    def missing_days(self, provider, lat, lon, start_day, end_day, tz=''):
+        """Days in the range with no cached payload, in order"""
+        lat_e4, lon_e4 = self._coords(lat, lon)
+        with self._lock:
+            present = {row[0] for row in self._connection().execute(
+                "SELECT day FROM entries WHERE provider=? AND lat_e4=? AND lon_e4=? "
+                "AND tz=? AND day BETWEEN ? AND ?",
+                (provider, lat_e4, lon_e4, tz, str(start_day)[:10], str(end_day)[:10])
+            )}
+        return [day for day in _day_range(start_day, end_day) if day not in present]
+
+    def put_many(self, provider, rows):
+        """Insert or replace (lat, lon, day, tz, payload) rows in one transaction"""
+        now = time.time()
+        records = [(provider, *self._coords(lat, lon), day, tz, json.dumps(payload, ensure_ascii=False), now)
+                   for lat, lon, day, tz, payload in rows]
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def flush(self):
+        """Writes are committed immediately; present for interface parity with RunCache"""
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+CACHE_BACKENDS = ['pickle', 'sqlite']
+CACHE_DB_NAME = 'cache.sqlite3'
+
+
+def open_cache(backend, cache_dir, flush_interval=FLUSH_INTERVAL):
+    """Cache backend by name: per-location pickles or the shared SQLite database"""
+    if backend == 'sqlite':
+        return SQLiteCache(os.path.join(cache_dir, CACHE_DB_NAME))
+    return RunCache(cache_dir, flush_interval)
+
+
+def migrate_pickles(cache_dir, db_path):
+    """Copy every <location>_<type>_cache.pkl entry and the alias table into the SQLite cache"""
+    db = SQLiteCache(db_path)
+    total = 0
+    for cache_file in sorted(glob.glob(os.path.join(cache_dir, '*_cache.pkl'))):
+        # Every entry key carries its own coordinates, so location- and namespace-named files both migrate
+        cache_type = os.path.basename(cache_file)[:-len('_cache.pkl')].rsplit('_', 1)[-1]
+        entries = RunCache._read(cache_file)
+        rows = [(*SQLiteCache._split_key(key), value) for key, value in entries.items()]
+        db.put_many(cache_type, rows)
+        total += len(rows)
+        print(f"Migrated {len(rows)} '{cache_type}' entries from {cache_file}")
+
+    # Resolved location strings, so known locations keep their namespace and skip geocoding
+    aliases_file = os.path.join(cache_dir, ALIASES_FILE)
+    aliases = RunCache._read(aliases_file)
+    for query, entry in aliases.items():
+        db.put_alias(query, entry['lat'], entry['lon'], entry['tz'])
+    if aliases:
+        total += len(aliases)
+        print(f"Migrated {len(aliases)} location aliases from {aliases_file}")
+    print(f"Migration complete: {total} entries in {db_path}")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache maintenance")
+    parser.add_argument("command", choices=['migrate'], help="migrate: copy .pkl caches into SQLite")
+    parser.add_argument("--cache-dir", default="./panchangam_cache", help="Directory with .pkl caches")
+    parser.add_argument("--db", default="./panchangam_cache/cache.sqlite3", help="SQLite cache database")
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate_pickles(args.cache_dir, args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# [SUMMARY]:
+# Columnar day table: one NumPy structured array row per day of a location's range
+# Sunrise, sunset and the noon times are UTC epoch seconds. Tithi / nakshatra (at each
+# event) and vaara / masa / ayana / samvatsara are small-int codes into label lists. A
+# validity mask says which columns hold data. ISO strings are parsed once, when a column
+# is filled, and renderers read columns instead of per-day API, panchang and vedic dicts.
+# A row is 65 bytes, against a few KB of dicts and strings per day before.
+
+# [USAGE]:
+# table = new_day_table('2025-01-01', '2025-12-31')
+# fill_sun_local(table, 39.36, -84.31)       # or fill_sun(table, sun_days) from API results
+# fill_sun_grid(table, SunGrid.load('sun_grid.npz'), 39.36, -84.31)  # interpolated, see sun_grid.py
+# fill_noon(table, 'America/New_York', (684, 648, 756))
+# starts = utc_stamps(table['sunrise'] - 72 * 60)  # ['20250101T113200Z', ...]
+# TITHI_LABELS.label(table['tithi'][0, EVENT_INDEX['sunrise']])
+
+
+from datetime import datetime
+
+import numpy as np
+
+from lunar_ephemeris import NAKSHATRA_NAMES, tithi_label
+from solar_ephemeris import solar_events
+from tz_tables import daily_utc
+
+
+EVENTS = ('sunrise', 'sunset', 'noon')
+EVENT_INDEX = {event: i for i, event in enumerate(EVENTS)}
+MISSING = -1  # Code of an absent tithi / nakshatra
+
+# Validity mask bits
+SUN = 1      # sunrise and sunset hold data (not polar day/night, not a failed fetch)
+NOON = 2     # noon, noon_start and noon_end hold data
+PANCHANG = {event: 4 << i for i, event in enumerate(EVENTS)}  # Tithi/nakshatra found at the event
+
+DAY_DTYPE = np.dtype([
+    ('day', 'datetime64[D]'),
+    ('sunrise', 'i8'),
+    ('sunset', 'i8'),
+    ('noon', 'i8'),          # Panchang lookup instant of the noon event
+    ('noon_start', 'i8'),
+    ('noon_end', 'i8'),
+    ('tithi', 'i2', (len(EVENTS),)),
+    ('nakshatra', 'i2', (len(EVENTS),)),
+    ('vaara', 'i1'),         # 0 = Sunday
+    ('masa', 'i1'),
+    ('ayana', 'i1'),
+    ('samvatsara', 'i1'),
+    ('valid', 'u1'),
+])
+
+
+class Labels:
+    """Append-only label list; code() gives each label a stable small-int code"""
+
+    def __init__(self, labels=()):
+        self.labels = []
+        self._codes = {}
+        for label in labels:
+            self.code(label)
+
+    def code(self, label):
+        if label is None:
+            return MISSING
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def label(self, code, missing=None):
+        return missing if code == MISSING else self.labels[code]
+
+
+# Seeded with the offline labels, so those codes are the ephemeris indices;
+# other spellings (e.g. from Prokerala) get the next free code
+TITHI_LABELS = Labels(tithi_label(i) for i in range(30))
+NAKSHATRA_LABELS = Labels(NAKSHATRA_NAMES)
+
+
+def new_day_table(start_date, end_date):
+    """Table with a row per day of the range; no column is valid yet"""
+    start = np.datetime64(str(start_date)[:10], 'D')
+    end = np.datetime64(str(end_date)[:10], 'D')
+    table = np.zeros((end - start).astype(int) + 1, dtype=DAY_DTYPE)
+    table['day'] = np.arange(start, end + np.timedelta64(1, 'D'))
+    table['tithi'] = table['nakshatra'] = MISSING
+    table['vaara'] = (table['day'].astype(np.int64) + 4) % 7  # 1970-01-01 was a Thursday
+    return table
+
+
+def day_strings(table):
+    """'YYYY-MM-DD' per row"""
+    return np.datetime_as_string(table['day']).tolist()
+
+
+def _epoch(iso):
+    return int(datetime.fromisoformat(iso.replace('Z', '+00:00')).timestamp())
+
+
+def fill_sun_row(table, i, results):
+    """Sunrise and sunset of row i from a sunrise-sunset.org 'results' payload (None leaves it invalid)"""
+    if results:
+        table['sunrise'][i] = _epoch(results['sunrise'])
+        table['sunset'][i] = _epoch(results['sunset'])
+        table['valid'][i] |= SUN
+
+
+def fill_sun(table, sun_days):
+    """Sunrise and sunset from {date_str: results or None}, as the API client or cache returns them"""
+    for i, day in enumerate(day_strings(table)):
+        fill_sun_row(table, i, sun_days.get(day))
+
+
+def fill_sun_local(table, lat, lon, rows=None):
+    """Sunrise and sunset from the offline solar calculator, rounded to the second like its ISO results
+
+    rows: optional boolean mask of the rows to fill (default all).
+    """
+    events = solar_events((table['day'][0], table['day'][-1]), [lat], [lon])
+    sunrise, sunset = events['sunrise'][0], events['sunset'][0]
+    found = ~(np.isnan(sunrise) | np.isnan(sunset))
+    if rows is not None:
+        found &= rows
+    table['sunrise'][found] = np.round(sunrise[found])
+    table['sunset'][found] = np.round(sunset[found])
+    table['valid'][found] |= SUN
+
+
+def fill_sun_grid(table, grid, lat, lon, rows=None):
+    """Sunrise and sunset interpolated from a precomputed sun_grid.SunGrid, rounded to the second
+
+    rows: optional boolean mask of the rows to fill (default all).
+    """
+    sunrise, sunset = grid.events(lat, lon, table['day'][0], table['day'][-1])
+    found = ~(np.isnan(sunrise) | np.isnan(sunset))
+    if rows is not None:
+        found &= rows
+    table['sunrise'][found] = np.round(sunrise[found])
+    table['sunset'][found] = np.round(sunset[found])
+    table['valid'][found] |= SUN
+
+
+def fill_noon(table, zone, minutes):
+    """Noon lookup, start and end from local wall times (minutes after midnight), DST-aware"""
+    seconds = daily_utc(zone, table['day'][0], table['day'][-1], minutes)
+    table['noon'], table['noon_start'], table['noon_end'] = seconds.T
+    table['valid'] |= NOON
+
+
+def degraded_rows(table, events=EVENTS):
+    """Boolean mask of the days where one of the events has its times but no tithi/nakshatra"""
+    valid = table['valid']
+    rows = np.zeros(len(table), dtype=bool)
+    for event in events:
+        has_times = valid & (NOON if event == 'noon' else SUN)
+        rows |= (has_times != 0) & ((valid & PANCHANG[event]) == 0)
+    return rows
+
+
+def utc_stamps(seconds):
+    """iCalendar UTC DATE-TIME strings (20250129T124459Z) for an array of epoch seconds"""
+    iso = np.datetime_as_string(np.asarray(seconds, dtype='datetime64[s]'))
+    return [f"{s[0:4]}{s[5:7]}{s[8:10]}T{s[11:13]}{s[14:16]}{s[17:19]}Z" for s in iso.tolist()]
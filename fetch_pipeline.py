@@ -0,0 +1,121 @@
+# [SUMMARY]:
+# asyncio fetch stage with per-host concurrency and token-bucket rate limits
+# Callers first work out every cache miss for a date range, queue one job per miss,
+# and run them together. Jobs are blocking functions (requests / geopy) executed in a
+# thread pool; each host gets a semaphore (max in-flight requests) and a token bucket
+# (sustained requests/second). Result callbacks run on the event loop thread, so cache
+# writes never race each other.
+# Wall time is bounded by the rate limit instead of latency x number of misses.
+# An optional cancelled() predicate is polled during rate-limit waits, so jobs still
+# queued when it trips (e.g. the API quota ran out) finish at once instead of idling.
+
+# [USAGE]:
+# pipeline = FetchPipeline({'api.sunrise-sunset.org': HostLimit(concurrency=4, rate=5)})
+# pipeline.add('api.sunrise-sunset.org', fetch_month, lat, lon, first, last, on_result=store)
+# results = pipeline.run()
+# FetchPipeline(HOST_LIMITS, cancelled=lambda: quota_spent)  # remaining jobs return None once True
+# estimated_seconds(HostLimit(concurrency=4, rate=5), 120)  # 23.8s for a planned batch
+
+
+import asyncio
+import functools
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+CANCEL_POLL = 0.25  # Seconds between cancelled() checks while waiting for a token
+
+
+# concurrency: max in-flight requests; rate: sustained requests/second; burst: bucket size
+HostLimit = namedtuple('HostLimit', ['concurrency', 'rate', 'burst'], defaults=[1])
+
+
+def estimated_seconds(limit, requests):
+    """Time `requests` calls need under a HostLimit's token bucket (response latency not included)"""
+    return max(0, requests - limit.burst) / limit.rate
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, `burst` back to back"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cancelled=None):
+        """Take a token, waiting for one; False instead if cancelled() turns True first"""
+        async with self._lock:
+            while True:
+                if cancelled is not None and cancelled():
+                    return False
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+                await asyncio.sleep(wait if cancelled is None else min(wait, CANCEL_POLL))
+
+
+class FetchPipeline:
+    """Queue of blocking fetch jobs run concurrently within per-host limits"""
+
+    def __init__(self, host_limits, max_concurrency=None, cancelled=None):
+        self.host_limits = host_limits
+        self.max_concurrency = max_concurrency
+        self.cancelled = cancelled  # Predicate; queued jobs are skipped (None) once it returns True
+        self._jobs = []
+
+    def add(self, host, func, *args, on_result=None):
+        """Queue func(*args); on_result(result) is called on the loop thread when it succeeds"""
+        self._jobs.append((host, functools.partial(func, *args), on_result))
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def run(self):
+        """Run every queued job and return their results in queue order (None on failure or cancel)"""
+        if not self._jobs:
+            return []
+        jobs, self._jobs = self._jobs, []
+        started = time.time()
+        self._skipped = 0
+        results = asyncio.run(self._run_all(jobs))
+        skipped = f" ({self._skipped} cancelled)" if self._skipped else ""
+        print(f"Fetched {len(jobs) - self._skipped} requests in {time.time() - started:.1f}s{skipped}")
+        return results
+
+    def _limit(self, host):
+        limit = self.host_limits.get(host, HostLimit(concurrency=1, rate=1))
+        if self.max_concurrency:
+            limit = limit._replace(concurrency=min(limit.concurrency, self.max_concurrency))
+        return limit
+
+    async def _run_all(self, jobs):
+        hosts = {host for host, _, _ in jobs}
+        limits = {host: self._limit(host) for host in hosts}
+        semaphores = {host: asyncio.Semaphore(limits[host].concurrency) for host in hosts}
+        buckets = {host: TokenBucket(limits[host].rate, limits[host].burst) for host in hosts}
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=sum(l.concurrency for l in limits.values())) as executor:
+            async def run_job(host, call, on_result):
+                async with semaphores[host]:
+                    if not await buckets[host].acquire(self.cancelled):
+                        self._skipped += 1
+                        return None
+                    try:
+                        result = await loop.run_in_executor(executor, call)
+                    except Exception as e:
+                        print(f"Fetch failed on {host}: {str(e)}")
+                        return None
+                if result is not None and on_result is not None:
+                    on_result(result)
+                return result
+
+            return await asyncio.gather(*(run_job(*job) for job in jobs))
@@ -0,0 +1,118 @@
+# [SUMMARY]:
+# Shared, cached Nominatim client for location and timezone lookups
+# Forward (place -> lat/lon) and reverse (lat/lon -> timezone) results are kept in a
+# JSON file with a TTL, so a location processed yesterday needs no network today.
+# One client is reused per process and requests are spaced to honour Nominatim's
+# usage policy of at most 1 request per second.
+
+# [USAGE]:
+# from geocoding import get_geocoder
+# geocoder = get_geocoder()
+# lat, lon = geocoder.geocode("Mason, OH")
+# tz_name = geocoder.timezone_name(lat, lon)
+
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from geopy.geocoders import Nominatim
+
+from cache_store import normalize_query
+
+
+GEOCODE_CACHE_FILE = "./panchangam_cache/geocode_cache.json"
+USER_AGENT = "multi_loc_panchangam"
+GEOCODE_TTL = 90 * 24 * 3600  # Places don't move; refresh every ~3 months
+MIN_REQUEST_INTERVAL = 1.0    # Nominatim usage policy: max 1 request/second
+
+
+class CachedGeocoder:
+    """Nominatim client with a persistent TTL cache and built-in rate limiting"""
+
+    def __init__(self, cache_file=GEOCODE_CACHE_FILE, user_agent=USER_AGENT, ttl=GEOCODE_TTL,
+                 min_interval=MIN_REQUEST_INTERVAL):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.min_interval = min_interval
+        self._client = None
+        self._user_agent = user_agent
+        self._lock = threading.Lock()
+        self._last_request = 0.0
+        self._cache = self._read()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = Nominatim(user_agent=self._user_agent)
+        return self._client
+
+    def _read(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"Warning: Geocode cache reset due to error: {str(e)}")
+        return {'forward': {}, 'reverse': {}}
+
+    def _write(self):
+        directory = os.path.dirname(self.cache_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self._cache, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.cache_file)
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry['fetched_at'] < self.ttl
+
+    def _throttle(self):
+        wait = self._last_request + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_request = time.monotonic()
+
+    def _store(self, kind, key, entry):
+        entry['fetched_at'] = time.time()
+        self._cache[kind][key] = entry
+        self._write()
+
+    def geocode(self, query):
+        """(lat, lon) for a place name, None when Nominatim can't find it"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._cache['forward'].get(key)
+            if not self._fresh(entry):
+                self._throttle()
+                location = self.client.geocode(query)
+                if not location:
+                    return None
+                entry = {'lat': location.latitude, 'lon': location.longitude}
+                self._store('forward', key, entry)
+        return entry['lat'], entry['lon']
+
+    def timezone_name(self, lat, lon):
+        """IANA timezone name from a reverse lookup, 'UTC' when none is reported"""
+        key = f"{lat:.4f},{lon:.4f}"
+        with self._lock:
+            entry = self._cache['reverse'].get(key)
+            if not self._fresh(entry):
+                self._throttle()
+                location = self.client.reverse(f"{lat},{lon}", exactly_one=True)
+                tz = location.raw['timezone']['tzid'] if location and 'timezone' in location.raw else 'UTC'
+                entry = {'tz': tz}
+                self._store('reverse', key, entry)
+        return entry['tz']
+
+
+_geocoders = {}
+
+
+def get_geocoder(cache_file=GEOCODE_CACHE_FILE):
+    """Process-wide shared geocoder for a cache file"""
+    if cache_file not in _geocoders:
+        _geocoders[cache_file] = CachedGeocoder(cache_file)
+    return _geocoders[cache_file]
@@ -0,0 +1,118 @@
+# [SUMMARY]:
+# Shared HTTP layer for sunrise-sunset.org, Prokerala and the Streamlit app
+# One requests.Session per process with a keep-alive connection pool per host, so a run
+# pays one TCP + TLS handshake per pooled connection instead of one per request.
+# Connect/read failures are retried at the transport level (urllib3 Retry); HTTP status
+# handling (429, 5xx, Retry-After) stays with the callers. Every request gets a default
+# (connect, read) timeout. connection_stats() reports how many requests reused a connection.
+
+# [USAGE]:
+# import http_client
+# response = http_client.get("https://api.sunrise-sunset.org/json", params={...})
+# http_client.configure(pool_size=20)   # Before the first request, e.g. from argparse
+# http_client.print_connection_stats()  # "HTTP: 380 requests over 6 connections (98% reused)"
+
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+POOL_SIZE = 10           # Keep-alive connections per host; at least the fetch concurrency
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+TRANSPORT_RETRIES = 2    # Connection / read errors only
+RETRY_BACKOFF = 0.5
+
+_settings = {
+    'pool_size': POOL_SIZE,
+    'timeout': (CONNECT_TIMEOUT, READ_TIMEOUT),
+    'retries': TRANSPORT_RETRIES,
+}
+_session = None
+_session_pid = None
+_lock = threading.Lock()
+
+
+def configure(pool_size=None, timeout=None, retries=None):
+    """Change pool size, default timeout or transport retries; rebuilds the session"""
+    global _session
+    with _lock:
+        if pool_size is not None:
+            _settings['pool_size'] = pool_size
+        if timeout is not None:
+            _settings['timeout'] = timeout
+        if retries is not None:
+            _settings['retries'] = retries
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _build_session():
+    retry = Retry(
+        total=_settings['retries'], connect=_settings['retries'], read=_settings['retries'],
+        status=0, backoff_factor=RETRY_BACKOFF, allowed_methods=None, raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=_settings['pool_size'], pool_maxsize=_settings['pool_size'],
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Process-wide pooled session (rebuilt after a fork; sockets can't be shared)"""
+    global _session, _session_pid
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _build_session()
+            _session_pid = os.getpid()
+        return _session
+
+
+def request(method, url, **kwargs):
+    kwargs.setdefault('timeout', _settings['timeout'])
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def connection_stats():
+    """{host: {'requests', 'connections', 'reused'}} for this process's pools"""
+    stats = {}
+    if _session is None or _session_pid != os.getpid():
+        return stats
+    adapters = {id(a): a for a in _session.adapters.values()}.values()
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            entry = stats.setdefault(pool.host, {'requests': 0, 'connections': 0})
+            entry['requests'] += pool.num_requests
+            entry['connections'] += pool.num_connections
+    for entry in stats.values():
+        entry['reused'] = max(0, entry['requests'] - entry['connections'])
+    return stats
+
+
+def print_connection_stats():
+    stats = connection_stats()
+    total_requests = sum(entry['requests'] for entry in stats.values())
+    if not total_requests:
+        return
+    total_connections = sum(entry['connections'] for entry in stats.values())
+    reused = 100 * (total_requests - total_connections) / total_requests
+    print(f"HTTP: {total_requests} requests over {total_connections} connections ({reused:.0f}% reused)")
+    for host, entry in sorted(stats.items()):
+        print(f"  {host}: {entry['requests']} requests, {entry['connections']} connections")
@@ -0,0 +1,346 @@
+# [SUMMARY]:
+# Streaming iCalendar (RFC 5545) writer shared by the scripts and the Streamlit app
+# Events are written to the sink (a file or any binary stream) as soon as they are
+# produced, so memory stays flat however many days and events a calendar has.
+# Content lines are escaped (\ ; , newline), end in CRLF, and are folded at 75 octets
+# without splitting a UTF-8 sequence, so long Telugu descriptions stay valid.
+# calendar_chunks() yields the same bytes piece by piece for streaming web responses.
+# EventTemplate precompiles everything static about an event type (SUMMARY, alarms, the
+# run's single DTSTAMP) into bytes once; rendering an event then only formats its times
+# and folds its description. Throughput: python ics_writer.py bench
+# write_calendar_days() regenerates incrementally: a sidecar manifest (<file>.manifest.json)
+# keeps each day's content hash (DTSTAMP excluded) and byte range. Unchanged days are copied
+# from the previous file with their original DTSTAMP, and a calendar with no changed days
+# is not rewritten at all. patch_calendar_days() replaces just a few days of an existing
+# calendar using the same manifest.
+
+# [USAGE]:
+# def my_events():
+#     yield event_lines(uid, start, end, summary, description, alarms=[('-PT15M', 'Reminder')])
+# write_calendar("Mason_OH.ics", my_events())  # Written to a temp file, then moved into place
+# for chunk in calendar_chunks(my_events()): response.write(chunk)
+# template = event_template('sunrise', "Sunrise at Mason, OH", (('-PT15M', 'Reminder'),))
+# yield template.render(start, end, escape_text(description))  # bytes, accepted by the writers
+# events, changed = write_calendar_days("Mason_OH.ics", (('2025-01-01', [event, ...]), ...))
+# changed = patch_calendar_days("Mason_OH.ics", {'2025-03-02': [event, ...]})  # None without a manifest
+
+
+import functools
+import hashlib
+import json
+import os
+import re
+import secrets
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+
+PRODID = "-//Sunrise Sunset Calendar//EN"
+MAX_LINE_OCTETS = 75
+CRLF = b"\r\n"
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_VERSION = 2
+_DTSTAMP_LINE = re.compile(rb"DTSTAMP:[0-9TZ]+\r\n")
+
+
+def escape_text(value):
+    """TEXT value escaping (RFC 5545 3.3.11)"""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """UTF-8 bytes of one content line, folded at 75 octets with CRLF + space continuations"""
+    data = line.encode('utf-8')
+    if len(data) <= MAX_LINE_OCTETS:
+        return data + CRLF
+
+    parts = []
+    start, limit = 0, MAX_LINE_OCTETS
+    while len(data) - start > limit:
+        end = start + limit
+        while data[end] & 0xC0 == 0x80:  # Don't cut inside a multi-byte character
+            end -= 1
+        parts.append(data[start:end])
+        start, limit = end, MAX_LINE_OCTETS - 1  # Continuation lines start with a space
+    parts.append(data[start:])
+    return (CRLF + b" ").join(parts) + CRLF
+
+
+def format_utc(moment):
+    """DATE-TIME in UTC form, e.g. 20250129T124459Z (fixed-width slice of isoformat, faster than strftime)
+
+    Strings are taken as already formatted (day_table.utc_stamps).
+    """
+    if isinstance(moment, str):
+        return moment
+    return moment.isoformat()[:19].replace('-', '').replace(':', '') + 'Z'
+
+
+RUN_DTSTAMP = format_utc(datetime.now(timezone.utc))  # One creation stamp for every event of a run
+
+
+def event_lines(uid, start, end, summary, description, alarms=(), dtstamp=RUN_DTSTAMP):
+    """Unfolded content lines of one VEVENT; alarms are (trigger, description) pairs"""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART:{format_utc(start)}",
+        f"DTEND:{format_utc(end)}",
+        f"SUMMARY:{escape_text(summary)}",
+        f"DESCRIPTION:{escape_text(description)}",
+    ]
+    for trigger, alarm_description in alarms:
+        lines += [
+            "BEGIN:VALARM",
+            f"TRIGGER:{trigger}",
+            "ACTION:DISPLAY",
+            f"DESCRIPTION:{escape_text(alarm_description)}",
+            "END:VALARM",
+        ]
+    lines.append("END:VEVENT")
+    return lines
+
+
+class EventTemplate:
+    """One event type's static content lines, folded and encoded once"""
+
+    def __init__(self, event_type, summary, alarms=(), dtstamp=RUN_DTSTAMP):
+        self._dtstamp = dtstamp
+        self._after_uid = f"@{event_type}\r\nDTSTAMP:{dtstamp}\r\nDTSTART:"
+        self._summary = fold_line(f"SUMMARY:{escape_text(summary)}")
+        tail = []
+        for trigger, alarm_description in alarms:
+            tail += ["BEGIN:VALARM", f"TRIGGER:{trigger}", "ACTION:DISPLAY",
+                     f"DESCRIPTION:{escape_text(alarm_description)}", "END:VALARM"]
+        tail.append("END:VEVENT")
+        self._tail = b"".join(fold_line(line) for line in tail)
+
+    def render(self, start, end, description, uid=None):
+        """Rendered VEVENT bytes; description must already be escaped (escape_text)
+
+        uid defaults to the start time plus event type.
+        """
+        start_utc = format_utc(start)
+        if uid is None:
+            head = f"BEGIN:VEVENT\r\nUID:{start_utc[:-1]}{self._after_uid}{start_utc}\r\nDTEND:{format_utc(end)}\r\n"
+            return head.encode('ascii') + self._summary + fold_line("DESCRIPTION:" + description) + self._tail
+        return (b"BEGIN:VEVENT\r\n" + fold_line(f"UID:{uid}") +
+                f"DTSTAMP:{self._dtstamp}\r\nDTSTART:{start_utc}\r\nDTEND:{format_utc(end)}\r\n".encode('ascii') +
+                self._summary + fold_line("DESCRIPTION:" + description) + self._tail)
+
+
+@functools.lru_cache(maxsize=None)
+def event_template(event_type, summary, alarms=()):
+    """Shared EventTemplate per (event type, summary, alarms); alarms must be a tuple"""
+    return EventTemplate(event_type, summary, alarms)
+
+
+class CalendarWriter:
+    """Writes VCALENDAR header, events and footer to a binary sink as they arrive"""
+
+    def __init__(self, sink, prodid=PRODID):
+        self.sink = sink
+        self.prodid = prodid
+        self.events = 0
+
+    def begin(self):
+        for line in ("BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{self.prodid}"):
+            self.sink.write(fold_line(line))
+
+    def write_event(self, event):
+        """event: content lines from event_lines, or bytes from EventTemplate.render"""
+        self.sink.write(event if isinstance(event, bytes) else b"".join(fold_line(line) for line in event))
+        self.events += 1
+
+    def end(self):
+        self.sink.write(fold_line("END:VCALENDAR"))
+
+
+def _temp_file(filename, suffix):
+    """(fd, path) of a new temp file beside filename, with the mode a plain open() would give it"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    while True:
+        tmp_path = os.path.join(directory, f"tmp{secrets.token_hex(4)}{suffix}")
+        try:
+            # 0o666 less the umask, applied by the OS as for open(); mkstemp files are owner-only
+            return os.open(tmp_path, flags, 0o666), tmp_path
+        except FileExistsError:
+            continue
+
+
+def write_calendar(filename, events, prodid=PRODID):
+    """Stream events (content lines or rendered bytes) into filename; returns the event count
+
+    The calendar is written to a temp file next to the target and moved into place,
+    so an interrupted run never leaves a truncated .ics behind.
+    """
+    fd, tmp_path = _temp_file(filename, '.ics.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as sink:
+            writer = CalendarWriter(sink, prodid)
+            writer.begin()
+            for lines in events:
+                writer.write_event(lines)
+            writer.end()
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return writer.events
+
+
+def manifest_path(filename):
+    return filename + MANIFEST_SUFFIX
+
+
+def _load_manifest(filename, prodid):
+    """Previous run's manifest, None when missing, stale or for a file that has since changed"""
+    try:
+        with open(manifest_path(filename), encoding='utf-8') as f:
+            manifest = json.load(f)
+        stat = os.stat(filename)
+    except (OSError, ValueError):
+        return None
+    if (manifest.get('version') != MANIFEST_VERSION or manifest.get('prodid') != prodid
+            or manifest.get('size') != stat.st_size or manifest.get('mtime_ns') != stat.st_mtime_ns):
+        return None
+    return manifest
+
+
+def _save_manifest(filename, prodid, days):
+    stat = os.stat(filename)
+    manifest = {'version': MANIFEST_VERSION, 'prodid': prodid, 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns, 'days': days}
+    fd, tmp_path = _temp_file(filename, '.json.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp_path, manifest_path(filename))
+
+
+def day_hash(data):
+    """Content hash of a day's rendered events, ignoring DTSTAMP"""
+    return hashlib.sha1(_DTSTAMP_LINE.sub(b"", data)).hexdigest()
+
+
+def write_calendar_days(filename, days, prodid=PRODID):
+    """Incrementally regenerate filename from (day, [events]) pairs in order
+
+    Events are content lines or rendered bytes; None keeps the day as it is in the
+    previous file. Days whose content hash matches the manifest keep their bytes from
+    the previous file (and so their DTSTAMP); a calendar with the same days and no
+    changes is left untouched.
+    Returns (event count, number of days added, changed or removed).
+    """
+    previous = _load_manifest(filename, prodid)
+    old_days = previous['days'] if previous else {}
+    fd, tmp_path = _temp_file(filename, '.ics.tmp')
+    old_file = open(filename, 'rb') if previous else None
+    new_days = {}
+    events = changed = 0
+    try:
+        with os.fdopen(fd, 'wb') as sink:
+            writer = CalendarWriter(sink, prodid)
+            writer.begin()
+            for day, day_events in days:
+                old = old_days.get(day)
+                if day_events is None:
+                    digest, count = old[0], old[3]
+                else:
+                    data = b"".join(e if isinstance(e, bytes) else b"".join(fold_line(line) for line in e)
+                                    for e in day_events)
+                    digest, count = day_hash(data), len(day_events)
+                if old is not None and old[0] == digest:
+                    old_file.seek(old[1])
+                    data = old_file.read(old[2])
+                else:
+                    changed += 1
+                new_days[day] = [digest, sink.tell(), len(data), count]
+                sink.write(data)
+                events += count
+            writer.end()
+        changed += len(old_days.keys() - new_days.keys())  # Days that dropped out of the range
+        if previous and not changed and list(new_days) == list(old_days):
+            os.unlink(tmp_path)
+            return events, 0
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    finally:
+        if old_file is not None:
+            old_file.close()
+    _save_manifest(filename, prodid, new_days)
+    return events, changed
+
+
+def patch_calendar_days(filename, replacements, prodid=PRODID):
+    """Replace the events of some days ({day: [events]}) in a calendar written by write_calendar_days
+
+    Every other day is copied as is. Returns the number of changed days, or None when
+    the calendar has no valid manifest or doesn't contain all of the days.
+    """
+    previous = _load_manifest(filename, prodid)
+    if previous is None or not replacements.keys() <= previous['days'].keys():
+        return None
+    days = ((day, replacements.get(day)) for day in previous['days'])
+    return write_calendar_days(filename, days, prodid)[1]
+
+
+class _ChunkSink:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+
+def calendar_chunks(events, prodid=PRODID):
+    """Yield the calendar as bytes, one chunk per event (for streaming HTTP responses)"""
+    sink = _ChunkSink()
+    writer = CalendarWriter(sink, prodid)
+    writer.begin()
+    for lines in events:
+        writer.write_event(lines)
+        yield b"".join(sink.chunks)
+        sink.chunks.clear()
+    writer.end()
+    yield b"".join(sink.chunks)
+
+
+def bench(count=100000):
+    """Events/second for event_lines vs a precompiled EventTemplate (Telugu description)"""
+    start = datetime(2025, 1, 1, 11, 47, tzinfo=timezone.utc)
+    summary = "ప్రాతః సంధ్యా సమయం at Mason, OH"
+    alarms = (('-PT15M', "Reminder: ప్రాతః సంధ్యా సమయం in 10 minutes."),
+              ('PT0M', "Reminder: ప్రాతః సంధ్యా సమయం is starting now."))
+    description = ("ప్రాతః సంధ్యా సమయం at Mason, OH on 2025-01-01\nసంవత్సరము: క్రోధి నామ సంవత్సరం\n"
+                   "అయనము: దక్షిణాయనము\nమాసము: మాఘ\nతిథి: శుక్ల పక్ష విదియ\nవారము: సౌమ్య వారము\n")
+    times = [start + timedelta(days=i) for i in range(count)]
+
+    began = time.perf_counter()
+    for moment in times:
+        b"".join(fold_line(line) for line in event_lines(
+            f"{moment.strftime('%Y%m%dT%H%M%S')}@sunrise", moment, moment, summary, description, alarms))
+    baseline = count / (time.perf_counter() - began)
+
+    template = event_template('sunrise', summary, alarms)
+    escaped = escape_text(description)
+    began = time.perf_counter()
+    for moment in times:
+        template.render(moment, moment, escaped)
+    compiled = count / (time.perf_counter() - began)
+
+    print(f"event_lines:   {baseline:,.0f} events/s")
+    print(f"EventTemplate: {compiled:,.0f} events/s ({compiled / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+    else:
+        print("Usage: python ics_writer.py bench [events]")
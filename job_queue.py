@@ -0,0 +1,278 @@
+# [SUMMARY]:
+# Durable, resumable work queue for multi-location runs (SQLite)
+# One job per (location, start date, end date). Workers claim a job under a lease that a
+# background thread keeps renewing, and record a checkpoint after each finished day. A
+# job whose worker crashed is reclaimed once its lease runs out. A job that ran out of
+# Prokerala quota is deferred until the quota resets; its fetched days are already in the
+# cache, so the resumed run only fetches what is still missing.
+# Any number of worker processes can drain one queue file. Several hosts can share it too,
+# as long as the file sits on a filesystem with working locks (not most NFS setups).
+# The same database keeps the degraded-day ledger: calendar days written with fallback
+# panchang data, so they can be backfilled once quota is available again.
+
+# [USAGE]:
+# queue = JobQueue("./panchangam_cache/jobs.sqlite3")
+# queue.enqueue("Mason, OH", "2025-01-01", "2025-12-31", {'events': ['sunrise', 'sunset']})
+# job = queue.claim()
+# with queue.leased(job):
+#     ...; queue.checkpoint(job, '2025-01-31')
+# queue.complete(job)  # or queue.defer(job, retry_at, reason) / queue.fail(job, error)
+# queue.record_degraded("Mason_OH.ics", "Mason, OH", params, '2025-01-01', '2025-12-31', ['2025-03-02'])
+# python job_queue.py status ./panchangam_cache/jobs.sqlite3
+
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+from cache_store import BUSY_TIMEOUT
+
+
+QUEUE_DB_NAME = 'jobs.sqlite3'
+LEASE_SECONDS = 300      # A crashed worker's job is reclaimed after this long
+MAX_ATTEMPTS = 3         # Failed jobs are retried up to this many times
+FAIL_RETRY_DELAY = 300   # Seconds before a failed job is retried, times the attempts so far
+
+Job = namedtuple('Job', ['id', 'location', 'start_date', 'end_date', 'params', 'checkpoint', 'attempts'])
+
+
+class JobQueue:
+    """(location, date range) jobs with leases, day checkpoints and deferral"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            location TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            lease_until REAL NOT NULL DEFAULT 0,
+            not_before REAL NOT NULL DEFAULT 0,
+            checkpoint TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at REAL NOT NULL,
+            UNIQUE (location, start_date, end_date)
+        );
+        CREATE TABLE IF NOT EXISTS degraded_days (
+            filename TEXT NOT NULL,
+            day TEXT NOT NULL,
+            location TEXT NOT NULL,
+            params TEXT NOT NULL,
+            recorded_at REAL NOT NULL,
+            PRIMARY KEY (filename, day)
+        );
+    """
+
+    def __init__(self, db_path, worker_id=None, lease_seconds=LEASE_SECONDS):
+        self.db_path = db_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._lock:
+            self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        # Connections must not cross a fork, so each process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params)
+
+    def enqueue(self, location, start_date, end_date, params=None):
+        """Add a job, or reset the same location and range unless it is pending or running; returns its id"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (location, start_date, end_date, params, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (location, start_date, end_date, json.dumps(params or {}), time.time())
+            )
+            # Re-enqueueing a finished, failed or deferred job (e.g. with new options) runs it again now
+            conn.execute(
+                "UPDATE jobs SET params=?, status='pending', attempts=0, not_before=0, error=NULL, updated_at=? "
+                "WHERE location=? AND start_date=? AND end_date=? AND status IN ('done', 'failed', 'deferred')",
+                (json.dumps(params or {}), time.time(), location, start_date, end_date)
+            )
+            return conn.execute(
+                "SELECT id FROM jobs WHERE location=? AND start_date=? AND end_date=?",
+                (location, start_date, end_date)
+            ).fetchone()[0]
+
+    def claim(self, job_ids=None):
+        """Lease the next runnable job (optionally one of job_ids) to this worker, None when nothing can run now"""
+        now = time.time()
+        only = f" AND id IN ({','.join(str(int(i)) for i in job_ids)})" if job_ids is not None else ""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")  # One claimer at a time across processes
+            try:
+                row = conn.execute(
+                    "SELECT id, location, start_date, end_date, params, checkpoint, attempts FROM jobs "
+                    "WHERE ((status IN ('pending', 'deferred') AND not_before <= ?) "
+                    "   OR (status = 'running' AND lease_until < ?) "
+                    "   OR (status = 'failed' AND attempts < ? AND not_before <= ?))" + only +
+                    " ORDER BY id LIMIT 1",
+                    (now, now, MAX_ATTEMPTS, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status='running', worker=?, lease_until=?, attempts=attempts+1, "
+                        "updated_at=? WHERE id=?",
+                        (self.worker_id, now + self.lease_seconds, now, row[0])
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, location, start_date, end_date, params, checkpoint, attempts = row
+        return Job(job_id, location, start_date, end_date, json.loads(params), checkpoint, attempts + 1)
+
+    def _update(self, job, sql, params):
+        """Update a job only while this worker still holds it"""
+        cursor = self._execute(
+            f"UPDATE jobs SET {sql}, updated_at=? WHERE id=? AND worker=? AND status='running'",
+            (*params, time.time(), job.id, self.worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def renew(self, job):
+        return self._update(job, "lease_until=?", (time.time() + self.lease_seconds,))
+
+    def checkpoint(self, job, day):
+        """Record the last finished day (YYYY-MM-DD) and renew the lease"""
+        return self._update(job, "checkpoint=?, lease_until=?", (day, time.time() + self.lease_seconds))
+
+    def complete(self, job):
+        return self._update(job, "status='done', error=NULL", ())
+
+    def defer(self, job, retry_at, reason):
+        """Put the job back until retry_at (epoch seconds), e.g. when the API quota resets"""
+        return self._update(job, "status='deferred', not_before=?, attempts=attempts-1, error=?",
+                            (retry_at, reason))
+
+    def release(self, job):
+        """Hand the job back untouched, e.g. on Ctrl+C"""
+        return self._update(job, "status='pending', attempts=attempts-1", ())
+
+    def fail(self, job, error):
+        """Mark the job failed; it is retried later until it has had MAX_ATTEMPTS"""
+        return self._update(job, "status='failed', not_before=?, error=?",
+                            (time.time() + FAIL_RETRY_DELAY * job.attempts, str(error)))
+
+    @contextmanager
+    def leased(self, *jobs):
+        """Keep renewing the jobs' leases from a background thread while the block runs"""
+        stop = threading.Event()
+
+        def keep_alive():
+            while not stop.wait(self.lease_seconds / 3):
+                for job in jobs:
+                    self.renew(job)
+
+        thread = threading.Thread(target=keep_alive, daemon=True)
+        thread.start()
+        try:
+            yield jobs
+        finally:
+            stop.set()
+            thread.join()
+
+    def record_degraded(self, filename, location, params, start_date, end_date, days):
+        """Make days the ledger's degraded days of filename within start_date..end_date"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM degraded_days WHERE filename=? AND day BETWEEN ? AND ?",
+                             (filename, start_date, end_date))
+                conn.executemany(
+                    "INSERT INTO degraded_days (filename, day, location, params, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                    [(filename, day, location, json.dumps(params), now) for day in days]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def clear_degraded(self, filename, days):
+        with self._lock:
+            self._connection().executemany("DELETE FROM degraded_days WHERE filename=? AND day=?",
+                                           [(filename, day) for day in days])
+
+    def degraded_days(self):
+        """{(filename, location, params): [day, ...]} in day order"""
+        rows = self._execute(
+            "SELECT filename, location, params, day FROM degraded_days ORDER BY filename, day"
+        ).fetchall()
+        ledger = {}
+        for filename, location, params, day in rows:
+            ledger.setdefault((filename, location, params), []).append(day)
+        return ledger
+
+    def next_runnable_at(self):
+        """Earliest not_before of deferred or retryable jobs, None when none are waiting"""
+        row = self._execute(
+            "SELECT MIN(not_before) FROM jobs WHERE status='deferred' OR (status='failed' AND attempts < ?)",
+            (MAX_ATTEMPTS,)
+        ).fetchone()
+        return row[0]
+
+    def counts(self):
+        rows = self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def jobs(self):
+        return self._execute(
+            "SELECT id, location, start_date, end_date, status, checkpoint, attempts, not_before, worker, error "
+            "FROM jobs ORDER BY id"
+        ).fetchall()
+
+
+def print_status(queue):
+    for job_id, location, start, end, status, checkpoint, attempts, not_before, worker, error in queue.jobs():
+        line = f"{job_id:>4} {status:<9} {location} {start}..{end} done through {checkpoint or '-'}"
+        if status == 'deferred':
+            line += f", resumes {datetime.fromtimestamp(not_before).strftime('%Y-%m-%d %H:%M')}"
+        if status == 'running':
+            line += f", worker {worker}"
+        if error and status != 'done':
+            line += f" ({error})"
+        print(line)
+    for (filename, location, params), days in queue.degraded_days().items():
+        shown = ', '.join(days[:5]) + (', ...' if len(days) > 5 else '')
+        print(f"degraded  {filename}: {len(days)} days with fallback panchang ({shown})")
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'status':
+        print("Usage: python job_queue.py status [queue.sqlite3]")
+        return
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join("./panchangam_cache", QUEUE_DB_NAME)
+    print_status(JobQueue(db_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# [SUMMARY]:
+# Offline tithi / paksha / nakshatra calculator
+# Sidereal sun and moon longitudes with the Lahiri (Chitrapaksha) ayanamsa,
+# the same system Prokerala uses for `ayanamsa: 1`.
+# Moon: Meeus ch. 47 main periodic terms (~10" accuracy), Sun: Meeus ch. 25 (~0.01 deg).
+# Transitions land within a couple of minutes of Prokerala, with no API calls.
+
+# [USAGE]:
+# from lunar_ephemeris import panchang_at, panchang_intervals, tithi_label
+# panchang_at(epoch_seconds_array)  # vectorized over any number of instants
+# panchang_intervals(start_epoch, end_epoch)  # tithi/nakshatra start-end boundaries
+# ugadi_for_year(2026)  # date(2026, 3, 19)
+
+
+import functools
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from solar_ephemeris import J2000, SECONDS_PER_DAY, UNIX_EPOCH_JD, sun_apparent_longitude
+
+
+TITHI_SPAN = 12.0            # Degrees of moon-sun elongation per tithi
+NAKSHATRA_SPAN = 360.0 / 27  # 13°20' of sidereal moon longitude per nakshatra
+
+# Transition search: hourly samples (no tithi/nakshatra is that short), then bisection
+SAMPLE_STEP = 3600
+BISECTION_STEPS = 12  # 3600 s / 2**12 < 1 s
+
+# Ugadi is reckoned for India, with sunrise taken as 06:00 IST (UTC+5:30)
+IST_OFFSET = 5 * 3600 + 30 * 60
+UGADI_SUNRISE = 6 * 3600
+
+# Lahiri ayanamsa at J2000 and IAU 2006 general precession in longitude (arcsec)
+LAHIRI_J2000 = 23.857092
+PRECESSION = (5028.796195, 1.1054348)
+
+PAKSHA_NAMES = ['శుక్ల పక్ష', 'కృష్ణ పక్ష']
+
+TITHI_NAMES = [
+    'పాడ్యమి', 'విదియ', 'తదియ', 'చవితి', 'పంచమి',
+    'షష్ఠి', 'సప్తమి', 'అష్టమి', 'నవమి', 'దశమి',
+    'ఏకాదశి', 'ద్వాదశి', 'త్రయోదశి', 'చతుర్దశి', 'పౌర్ణమి',
+    'పాడ్యమి', 'విదియ', 'తదియ', 'చవితి', 'పంచమి',
+    'షష్ఠి', 'సప్తమి', 'అష్టమి', 'నవమి', 'దశమి',
+    'ఏకాదశి', 'ద్వాదశి', 'త్రయోదశి', 'చతుర్దశి', 'అమావాస్య'
+]
+
+NAKSHATRA_NAMES = [
+    'అశ్విని', 'భరణి', 'కృత్తిక', 'రోహిణి', 'మృగశిర', 'ఆర్ద్ర',
+    'పునర్వసు', 'పుష్యమి', 'ఆశ్లేష', 'మఖ', 'పుబ్బ', 'ఉత్తర',
+    'హస్త', 'చిత్త', 'స్వాతి', 'విశాఖ', 'అనూరాధ', 'జ్యేష్ఠ',
+    'మూల', 'పూర్వాషాఢ', 'ఉత్తరాషాఢ', 'శ్రవణం', 'ధనిష్ఠ', 'శతభిషం',
+    'పూర్వాభాద్ర', 'ఉత్తరాభాద్ర', 'రేవతి'
+]
+
+# Meeus table 47.A: multiples of D, M, M', F and sine coefficient (1e-6 deg)
+MOON_LONGITUDE_TERMS = np.array([
+    (0, 0, 1, 0, 6288774), (2, 0, -1, 0, 1274027), (2, 0, 0, 0, 658314),
+    (0, 0, 2, 0, 213618), (0, 1, 0, 0, -185116), (0, 0, 0, 2, -114332),
+    (2, 0, -2, 0, 58793), (2, -1, -1, 0, 57066), (2, 0, 1, 0, 53322),
+    (2, -1, 0, 0, 45758), (0, 1, -1, 0, -40923), (1, 0, 0, 0, -34720),
+    (0, 1, 1, 0, -30383), (2, 0, 0, -2, 15327), (0, 0, 1, 2, -12528),
+    (0, 0, 1, -2, 10980), (4, 0, -1, 0, 10675), (0, 0, 3, 0, 10034),
+    (4, 0, -2, 0, 8548), (2, 1, -1, 0, -7888), (2, 1, 0, 0, -6766),
+    (1, 0, -1, 0, -5163), (1, 1, 0, 0, 4987), (2, -1, 1, 0, 4036),
+    (2, 0, 2, 0, 3994), (4, 0, 0, 0, 3861), (2, 0, -3, 0, 3665),
+    (0, 1, -2, 0, -2689), (2, 0, -1, 2, -2602), (2, -1, -2, 0, 2390),
+    (1, 0, 1, 0, -2348), (2, -2, 0, 0, 2236), (0, 1, 2, 0, -2120),
+    (0, 2, 0, 0, -2069), (2, -2, -1, 0, 2048), (2, 0, 1, -2, -1773),
+    (2, 0, 0, 2, -1595), (4, -1, -1, 0, 1215), (0, 0, 2, 2, -1110),
+    (3, 0, -1, 0, -892), (2, 1, 1, 0, -810), (4, -1, -2, 0, 759),
+    (0, 2, -1, 0, -713), (2, 2, -1, 0, -700), (2, 1, -2, 0, 691),
+    (2, -1, 0, -2, 596), (4, 0, 1, 0, 549), (0, 0, 4, 0, 537),
+    (4, -1, 0, 0, 520), (1, 0, -2, 0, -487), (2, 1, 0, -2, -399),
+    (0, 0, 2, -2, -381), (1, 1, 1, 0, 351), (3, 0, -2, 0, -340),
+    (4, 0, -3, 0, 330), (2, -1, 2, 0, 327), (0, 2, 1, 0, -323),
+    (1, 1, -1, 0, 299), (2, 0, 3, 0, 294),
+], dtype=float)
+
+
+def _julian_day(epoch_seconds):
+    return np.asarray(epoch_seconds, dtype=float) / SECONDS_PER_DAY + UNIX_EPOCH_JD
+
+
+def _polynomial(t, *coeffs):
+    return sum(c * t ** i for i, c in enumerate(coeffs))
+
+
+def _nutation_longitude(t):
+    """Dominant nutation term in longitude (degrees)"""
+    return -0.00478 * np.sin(np.radians(125.04 - 1934.136 * t))
+
+
+def moon_apparent_longitude(jd):
+    """Apparent tropical longitude of the moon in degrees"""
+    t = (np.asarray(jd, dtype=float) - J2000) / 36525.0
+    l_mean = _polynomial(t, 218.3164477, 481267.88123421, -0.0015786, 1 / 538841, -1 / 65194000)
+    d = _polynomial(t, 297.8501921, 445267.1114034, -0.0018819, 1 / 545868, -1 / 113065000)
+    m = _polynomial(t, 357.5291092, 35999.0502909, -0.0001536, 1 / 24490000)
+    m_moon = _polynomial(t, 134.9633964, 477198.8675055, 0.0087414, 1 / 69699, -1 / 14712000)
+    f = _polynomial(t, 93.2720950, 483202.0175233, -0.0036539, -1 / 3526000, 1 / 863310000)
+    e = 1 - 0.002516 * t - 0.0000074 * t * t
+
+    terms = MOON_LONGITUDE_TERMS
+    args = np.radians(np.multiply.outer(d, terms[:, 0]) + np.multiply.outer(m, terms[:, 1])
+                      + np.multiply.outer(m_moon, terms[:, 2]) + np.multiply.outer(f, terms[:, 3]))
+    eccentricity = np.power.outer(e, np.abs(terms[:, 1]))
+    sigma = np.sum(terms[:, 4] * eccentricity * np.sin(args), axis=-1)
+
+    a1 = np.radians(119.75 + 131.849 * t)
+    a2 = np.radians(53.09 + 479264.290 * t)
+    sigma += (3958 * np.sin(a1) + 1962 * np.sin(np.radians(l_mean - f)) + 318 * np.sin(a2))
+
+    return np.mod(l_mean + sigma / 1e6 + _nutation_longitude(t), 360.0)
+
+
+def lahiri_ayanamsa(jd):
+    """Lahiri ayanamsa in degrees, including nutation so it pairs with apparent longitudes"""
+    t = (np.asarray(jd, dtype=float) - J2000) / 36525.0
+    return LAHIRI_J2000 + (PRECESSION[0] * t + PRECESSION[1] * t * t) / 3600 + _nutation_longitude(t)
+
+
+def sidereal_longitudes(epoch_seconds):
+    """Sidereal (Lahiri) longitudes of the sun and moon in degrees for UTC epoch seconds"""
+    jd = _julian_day(epoch_seconds)
+    ayanamsa = lahiri_ayanamsa(jd)
+    sun = np.mod(sun_apparent_longitude(jd) - ayanamsa, 360.0)
+    moon = np.mod(moon_apparent_longitude(jd) - ayanamsa, 360.0)
+    return sun, moon
+
+
+def panchang_at(epoch_seconds):
+    """Vectorized tithi and nakshatra indices for UTC epoch seconds
+
+    Returns {'tithi': 0..29 (0-14 shukla, 15-29 krishna), 'nakshatra': 0..26} int arrays
+    """
+    sun, moon = sidereal_longitudes(epoch_seconds)
+    elongation = np.mod(moon - sun, 360.0)
+    return {
+        'tithi': (elongation // TITHI_SPAN).astype(int) % 30,
+        'nakshatra': (moon // NAKSHATRA_SPAN).astype(int) % 27,
+    }
+
+
+def panchang_intervals(start_epoch, end_epoch):
+    """Tithi and nakshatra intervals covering [start_epoch, end_epoch]
+
+    Returns {'tithi': [(start, end, index), ...], 'nakshatra': [...]} with UTC epoch seconds.
+    The first and last intervals are clipped to the requested window.
+    """
+    samples = np.arange(start_epoch, end_epoch + SAMPLE_STEP, SAMPLE_STEP, dtype=float)
+    sampled = panchang_at(samples)
+    intervals = {}
+    for kind, indices in sampled.items():
+        changes = np.nonzero(indices[1:] != indices[:-1])[0]
+        before = indices[changes]
+        lo, hi = samples[changes], samples[changes + 1]
+        for _ in range(BISECTION_STEPS):
+            mid = (lo + hi) / 2
+            moved = panchang_at(mid)[kind] != before
+            lo, hi = np.where(moved, lo, mid), np.where(moved, mid, hi)
+        bounds = np.concatenate([samples[:1], hi, samples[-1:]])
+        values = np.concatenate([indices[:1], indices[changes + 1]])
+        intervals[kind] = [(float(bounds[i]), float(bounds[i + 1]), int(values[i]))
+                           for i in range(len(values))]
+    return intervals
+
+
+def tithi_label(index):
+    """Telugu paksha + tithi name, e.g. 'శుక్ల పక్ష పంచమి'"""
+    return f"{PAKSHA_NAMES[index // 15]} {TITHI_NAMES[index]}"
+
+
+@functools.lru_cache(maxsize=None)
+def ugadi_for_year(year):
+    """Ugadi (Chaitra shukla pratipada) of a Gregorian year, as a date
+
+    Chaitra is the amanta month in which the sun enters sidereal Mesha. Ugadi is the day
+    whose sunrise falls in that month's pratipada, or the day pratipada starts when it
+    spans no sunrise (kshaya).
+    """
+    # Mesha sankranti: the sun's sidereal longitude wraps past 360 between March and April
+    start = datetime(year, 3, 1, tzinfo=timezone.utc).timestamp()
+    samples = start + np.arange(0, 61 * SECONDS_PER_DAY, SAMPLE_STEP, dtype=float)
+    sun, _ = sidereal_longitudes(samples)
+    sankranti = samples[np.nonzero(np.diff(sun) < -180)[0][0] + 1]
+
+    # The new moon before it starts Chaitra; the window runs past sankranti so pratipada isn't clipped
+    tithis = panchang_intervals(sankranti - 32 * SECONDS_PER_DAY, sankranti + 2 * SECONDS_PER_DAY)['tithi']
+    new_moon, pratipada_end = [(s, e) for s, e, index in tithis if index == 0 and s <= sankranti][-1]
+
+    day = (int(new_moon) + IST_OFFSET) // SECONDS_PER_DAY  # Day number (IST) the new moon falls on
+    for candidate in (day, day + 1):
+        if new_moon <= candidate * SECONDS_PER_DAY + UGADI_SUNRISE - IST_OFFSET < pratipada_end:
+            day = candidate
+            break
+    return date.fromordinal(date(1970, 1, 1).toordinal() + day)
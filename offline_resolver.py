@@ -0,0 +1,155 @@
+# [SUMMARY]:
+# Optional zero-network location resolver for batch jobs
+# Cities: a GeoNames dump (cities500.txt / cities15000.txt, tab separated) indexed by
+# normalized name for "City, ST" / "City, CC" queries and by a KD-tree for nearest-city lookups.
+# Timezones: timezone-boundary-builder GeoJSON (combined.json) behind a 1° grid index,
+# resolved with point-in-polygon tests. Without a polygon file the nearest city's
+# timezone is used instead.
+# Same geocode()/timezone_name() interface as geocoding.CachedGeocoder.
+
+# Data (not shipped with the repo):
+# https://download.geonames.org/export/dump/cities15000.zip
+# https://github.com/evansiroky/timezone-boundary-builder/releases (timezones.geojson.zip)
+
+# [USAGE]:
+# resolver = OfflineResolver("data/cities15000.txt", "data/combined.json")
+# lat, lon = resolver.geocode("Mason, OH")
+# resolver.timezone_name(lat, lon)  # 'America/New_York'
+
+
+import csv
+import json
+import math
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional; fall back to a vectorized linear scan
+    cKDTree = None
+
+from cache_store import normalize_query
+
+
+# GeoNames dump columns
+NAME, ASCII_NAME, ALTERNATE_NAMES, LATITUDE, LONGITUDE = 1, 2, 3, 4, 5
+COUNTRY_CODE, ADMIN1_CODE, POPULATION, TIMEZONE = 8, 10, 14, 17
+
+GRID_CELL = 1.0  # Degrees per timezone index cell
+
+
+def _unit_vectors(lats, lons):
+    """Points on the unit sphere, so Euclidean nearest == great-circle nearest"""
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _point_in_ring(lon, lat, ring):
+    """Even-odd ray casting against one closed ring (N x 2 array of lon, lat)"""
+    x1, y1 = ring[:-1, 0], ring[:-1, 1]
+    x2, y2 = ring[1:, 0], ring[1:, 1]
+    crosses = (y1 > lat) != (y2 > lat)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_at = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+    return bool(np.count_nonzero(crosses & (lon < x_at)) % 2)
+
+
+class TimezonePolygonIndex:
+    """IANA timezone of a coordinate from timezone-boundary polygons"""
+
+    def __init__(self, geojson_path):
+        with open(geojson_path, encoding='utf-8') as f:
+            features = json.load(f)['features']
+
+        self._polygons = []  # (tzid, outer ring, holes)
+        self._grid = defaultdict(list)
+        for feature in features:
+            tzid = feature['properties']['tzid']
+            geometry = feature['geometry']
+            polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            for rings in polygons:
+                outer = np.asarray(rings[0], dtype=float)
+                holes = [np.asarray(hole, dtype=float) for hole in rings[1:]]
+                index = len(self._polygons)
+                self._polygons.append((tzid, outer, holes))
+                min_lon, min_lat = outer.min(axis=0)
+                max_lon, max_lat = outer.max(axis=0)
+                for cell_lat in range(math.floor(min_lat / GRID_CELL), math.floor(max_lat / GRID_CELL) + 1):
+                    for cell_lon in range(math.floor(min_lon / GRID_CELL), math.floor(max_lon / GRID_CELL) + 1):
+                        self._grid[(cell_lat, cell_lon)].append(index)
+
+    def lookup(self, lat, lon):
+        """tzid containing the point, None over open ocean"""
+        cell = (math.floor(lat / GRID_CELL), math.floor(lon / GRID_CELL))
+        for index in self._grid.get(cell, []):
+            tzid, outer, holes = self._polygons[index]
+            if _point_in_ring(lon, lat, outer) and not any(_point_in_ring(lon, lat, h) for h in holes):
+                return tzid
+        return None
+
+
+class OfflineResolver:
+    """Gazetteer + timezone index with the CachedGeocoder interface"""
+
+    def __init__(self, cities_path, tz_polygons_path=None, min_population=0):
+        csv.field_size_limit(sys.maxsize)
+        names, lats, lons, populations, timezones = [], [], [], [], []
+        self._by_name = defaultdict(list)
+        with open(cities_path, encoding='utf-8', newline='') as f:
+            for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                population = int(row[POPULATION] or 0)
+                if population < min_population:
+                    continue
+                index = len(names)
+                names.append(row[NAME])
+                lats.append(float(row[LATITUDE]))
+                lons.append(float(row[LONGITUDE]))
+                populations.append(population)
+                timezones.append(row[TIMEZONE])
+                qualifiers = {row[COUNTRY_CODE].lower(), row[ADMIN1_CODE].lower()}
+                for name in {row[NAME], row[ASCII_NAME]}:
+                    self._by_name[normalize_query(name)].append((index, qualifiers))
+
+        self._lats = np.asarray(lats)
+        self._lons = np.asarray(lons)
+        self._populations = np.asarray(populations)
+        self._timezones = timezones
+        points = _unit_vectors(self._lats, self._lons)
+        self._tree = cKDTree(points) if cKDTree is not None else None
+        self._points = points
+        self._tz_index = TimezonePolygonIndex(tz_polygons_path) if tz_polygons_path else None
+        print(f"Offline resolver: {len(names)} places loaded from {cities_path}")
+
+    def _match(self, query):
+        """Most populous place whose name and qualifiers (state / country codes) match"""
+        parts = [normalize_query(part) for part in query.strip('"').split(',')]
+        candidates = self._by_name.get(parts[0], [])
+        qualifiers = {part for part in parts[1:] if part}
+        matches = [index for index, codes in candidates if qualifiers <= codes]
+        if not matches:
+            return None
+        return max(matches, key=lambda index: self._populations[index])
+
+    def nearest_city(self, lat, lon):
+        """Index of the closest gazetteer entry"""
+        point = _unit_vectors([lat], [lon])[0]
+        if self._tree is not None:
+            return int(self._tree.query(point)[1])
+        return int(np.argmin(np.sum((self._points - point) ** 2, axis=1)))
+
+    def geocode(self, query):
+        """(lat, lon) for 'City', 'City, ST' or 'City, ST, CC'; None when unknown"""
+        index = self._match(query)
+        if index is None:
+            return None
+        return float(self._lats[index]), float(self._lons[index])
+
+    def timezone_name(self, lat, lon):
+        """IANA timezone from the polygon index, else the nearest city's timezone"""
+        if self._tz_index is not None:
+            tzid = self._tz_index.lookup(lat, lon)
+            if tzid:
+                return tzid
+        return self._timezones[self.nearest_city(lat, lon)] or 'UTC'
@@ -0,0 +1,124 @@
+# [SUMMARY]:
+# Tithi / nakshatra interval timeline
+# Holds start-end intervals (UTC epoch seconds) for each panchang element and answers
+# "which tithi/nakshatra is in effect at this instant?" by binary search.
+# One fetch (Prokerala) or one computation (offline ephemeris) per day fills the
+# timeline, and sunrise, sunset, noon or any other instant is resolved from it.
+# Tithi and nakshatra boundaries are global instants, so fetched intervals are kept once
+# in a location-independent store (cache namespace 'global'), keyed by the UTC day of
+# the fetched instant; every location reads the same entries.
+
+# [USAGE]:
+# timeline = PanchangTimeline()
+# timeline.extend(local_timeline_intervals(start_epoch, end_epoch))
+# timeline.at(sunrise_time)  # {'tithi': ..., 'nakshatra': ...} or None if not covered
+# store_intervals(run_cache, sunrise_time, fetched)  # Shared with every other location
+# load_intervals(run_cache, date(2025, 1, 1), date(2025, 12, 31), timeline)
+
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+
+from lunar_ephemeris import NAKSHATRA_NAMES, panchang_intervals, tithi_label
+
+
+KINDS = ('tithi', 'nakshatra')
+BOUNDARY_TOLERANCE = 60  # Seconds; sources and windows can place one boundary slightly apart
+GLOBAL_NAMESPACE = 'global'  # Cache namespace of the location-independent store
+STORE_TYPE = 'panchang'
+
+
+def to_epoch(instant):
+    """Epoch seconds from a datetime, ISO string or number"""
+    if isinstance(instant, str):
+        instant = datetime.fromisoformat(instant.replace('Z', '+00:00'))
+    if isinstance(instant, datetime):
+        return instant.timestamp()
+    return float(instant)
+
+
+class PanchangTimeline:
+    """Sorted tithi and nakshatra intervals with O(log n) instant lookups"""
+
+    def __init__(self):
+        self._starts = {kind: [] for kind in KINDS}
+        self._intervals = {kind: [] for kind in KINDS}
+
+    def add(self, kind, start, end, label):
+        """Insert one interval; for a known boundary keep whichever copy reaches further"""
+        start, end = to_epoch(start), to_epoch(end)
+        starts = self._starts[kind]
+        i = bisect_left(starts, start - BOUNDARY_TOLERANCE)
+        if i < len(starts) and starts[i] <= start + BOUNDARY_TOLERANCE:
+            if end > self._intervals[kind][i][1]:
+                self._intervals[kind][i] = (start, end, label)
+            return
+        i = bisect_left(starts, start)
+        starts.insert(i, start)
+        self._intervals[kind].insert(i, (start, end, label))
+
+    def extend(self, intervals):
+        """Add {'tithi': [(start, end, label), ...], 'nakshatra': [...]}"""
+        for kind in KINDS:
+            for start, end, label in intervals.get(kind, []):
+                self.add(kind, start, end, label)
+
+    def lookup(self, kind, instant):
+        """Label of the interval containing the instant, None when not covered"""
+        t = to_epoch(instant)
+        i = bisect_right(self._starts[kind], t) - 1
+        if i >= 0:
+            start, end, label = self._intervals[kind][i]
+            if t < end:
+                return label
+        return None
+
+    def covers(self, instant):
+        return all(self.lookup(kind, instant) is not None for kind in KINDS)
+
+    def at(self, instant):
+        """Panchang details in effect at the instant, None when any element is missing"""
+        details = {kind: self.lookup(kind, instant) for kind in KINDS}
+        return details if all(details.values()) else None
+
+    def intervals(self):
+        """{'tithi': [(start, end, label), ...], 'nakshatra': [...]} in epoch seconds"""
+        return {kind: list(self._intervals[kind]) for kind in KINDS}
+
+
+def _store_key(day):
+    # Cache keys are (lat, lon, date, tz); the store belongs to no coordinates
+    return (0.0, 0.0, day, 'UTC')
+
+
+def utc_day(instant):
+    return datetime.fromtimestamp(to_epoch(instant), timezone.utc).date().isoformat()
+
+
+def store_intervals(cache, anchor, intervals):
+    """Merge one fetch's intervals into the global store under the anchor's UTC day"""
+    key = _store_key(utc_day(anchor))
+    timeline = PanchangTimeline()
+    timeline.extend(cache.get(GLOBAL_NAMESPACE, STORE_TYPE, key) or {})
+    timeline.extend(intervals)
+    cache.put(GLOBAL_NAMESPACE, STORE_TYPE, key, timeline.intervals())
+
+
+def load_intervals(cache, first_day, last_day, timeline):
+    """Extend timeline with the stored intervals of UTC days first_day..last_day (dates); returns it"""
+    day = first_day
+    while day <= last_day:
+        stored = cache.get(GLOBAL_NAMESPACE, STORE_TYPE, _store_key(day.isoformat()))
+        if stored:
+            timeline.extend(stored)
+        day += timedelta(days=1)
+    return timeline
+
+
+def local_timeline_intervals(start_epoch, end_epoch):
+    """Offline intervals with Telugu labels, ready for PanchangTimeline.extend"""
+    intervals = panchang_intervals(to_epoch(start_epoch), to_epoch(end_epoch))
+    return {
+        'tithi': [(s, e, tithi_label(i)) for s, e, i in intervals['tithi']],
+        'nakshatra': [(s, e, NAKSHATRA_NAMES[i]) for s, e, i in intervals['nakshatra']],
+    }
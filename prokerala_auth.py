@@ -0,0 +1,370 @@
+# [SUMMARY]:
+# Quota-aware scheduler over every Prokerala client in multi_secrets.toml
+# Each client keeps its own OAuth token, a sliding one-minute request window and a daily
+# credit budget. acquire() hands out the healthy client with the most credits left and
+# only waits when every client is at its per-minute limit, so concurrent fetch threads
+# spread across all keys and throughput grows with the number of keys.
+# Credits spent today are counted in a SQLite table (by default in the job queue database),
+# reserved with one atomic UPDATE per request, so a second run on the same day starts from
+# what is actually left and concurrent workers never spend a client past its budget.
+# Failures (429 / 5xx) pause only the client that hit them: for as long as the server asks
+# (Retry-After, X-RateLimit-Reset) or else an exponential backoff with jitter. After
+# CIRCUIT_THRESHOLD failures in a row the client's circuit opens for the maximum delay,
+# and a single success closes it again.
+# read_only=True (e.g. for a dry-run plan) only reads today's counts and creates nothing.
+
+# [USAGE]:
+# auth = ProkeralaAuth([{'id': '...', 'secret': '...'}, {'id': '...', 'secret': '...', 'daily_credits': 200}])
+# client = auth.acquire()  # None when every client is spent or unavailable
+# token = auth.get_access_token(client)
+# auth.record_failure(client, retry_after_seconds(response.headers))  # or auth.record_success(client, ...)
+
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+import http_client
+from cache_store import BUSY_TIMEOUT
+
+
+PROKERALA_TOKEN_URL = "https://api.prokerala.com/token"
+USAGE_DB = "./panchangam_cache/jobs.sqlite3"  # The job queue's database, so runs sharing a queue share budgets
+LEGACY_USAGE_FILE = "./panchangam_cache/prokerala_usage.json"  # Per-process counts kept by earlier versions
+REQUESTS_PER_MINUTE = 4  # Per client; one call every 15 seconds
+DAILY_CREDITS = 100      # Per client; free tier
+CREDITS_PER_REQUEST = 1
+CLIENT_CONCURRENCY = 2   # In-flight requests per client
+CIRCUIT_THRESHOLD = 3    # Consecutive 429 / 5xx responses before a client's circuit opens
+
+
+def _today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _next_reset():
+    """Epoch seconds of the next UTC midnight, when daily credits start over"""
+    tomorrow = datetime.now(timezone.utc).date() + timedelta(days=1)
+    return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=timezone.utc).timestamp()
+
+
+def retry_after_seconds(headers):
+    """Seconds the server asked us to wait (Retry-After or X-RateLimit-Reset), None if unspecified"""
+    value = headers.get('Retry-After')
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    if headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset'):
+        try:
+            reset = float(headers['X-RateLimit-Reset'])
+        except ValueError:
+            return None
+        # Either an epoch timestamp or a number of seconds from now
+        return max(0.0, reset - time.time()) if reset > 1e9 else reset
+    return None
+
+
+class BackoffPolicy:
+    """Exponential backoff with jitter that defers to server-provided waits"""
+
+    def __init__(self, base_delay=15, factor=1.5, max_delay=300):
+        self.base_delay = base_delay
+        self.factor = factor
+        self.max_delay = max_delay
+
+    def delay(self, failures, retry_after=None):
+        """Wait after the n-th consecutive failure; a server-provided wait wins over the schedule"""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 1)
+        delay = min(self.max_delay, self.base_delay * self.factor ** max(0, failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)  # "Equal jitter" keeps threads from retrying in lockstep
+
+
+class ProkeralaClient:
+    """One API key: its token, per-minute window and daily credit budget"""
+
+    def __init__(self, number, config):
+        self.number = number
+        self.id = config['id']
+        self.secret = config['secret']
+        self.rate_per_minute = config.get('rate_per_minute', REQUESTS_PER_MINUTE)
+        self.daily_credits = config.get('daily_credits', DAILY_CREDITS)
+        self.token = None
+        self.token_expiry = None
+        self.healthy = True
+        self.disabled_reason = None  # Why disable() took the client out of rotation
+        self.failures = 0        # Consecutive 429 / 5xx responses
+        self.paused_until = 0.0  # monotonic; set by backoff or an open circuit
+        self.used = 0
+        self.recent = deque()  # monotonic times of requests in the last minute
+        self.token_lock = threading.Lock()
+
+    def remaining(self):
+        return self.daily_credits - self.used
+
+    def next_slot(self, now):
+        """Earliest monotonic time this client may send its next request"""
+        while self.recent and now - self.recent[0] >= 60:
+            self.recent.popleft()
+        slot = now if len(self.recent) < self.rate_per_minute else self.recent[0] + 60
+        return max(slot, self.paused_until)
+
+
+class ProkeralaAuth:
+    """Dispatches requests across all configured clients by remaining budget"""
+
+    USAGE_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS prokerala_usage (
+            client_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            used INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (client_id, day)
+        );
+    """
+
+    def __init__(self, clients, usage_db=USAGE_DB, backoff=None, read_only=False):
+        self.clients = [ProkeralaClient(i + 1, config) for i, config in enumerate(clients)]
+        self.usage_db = usage_db
+        self.read_only = read_only
+        self.backoff = backoff or BackoffPolicy()
+        self._day = _today()
+        self._changed = threading.Condition()  # Guards scheduling state, shared by fetch threads
+        self._exhausted = False
+        self.retry_at = None  # Epoch seconds when requests may succeed again, set when acquire() gives up
+        self.request_budget = None  # Requests acquire() may still hand out (e.g. --budget); None for no cap
+        self.requests = 0  # Requests reserved by this process (refunds excluded)
+        self.refusals = 0  # Times acquire() returned None
+        self._conn = None
+        self._pid = None
+        with self._changed:
+            if not read_only:
+                os.makedirs(os.path.dirname(usage_db) or '.', exist_ok=True)
+                self._connection().executescript(self.USAGE_SCHEMA)
+                self._import_legacy_usage()
+            self._load_usage()
+
+    @property
+    def requests_per_second(self):
+        return sum(client.rate_per_minute for client in self.clients) / 60
+
+    @property
+    def concurrency(self):
+        return CLIENT_CONCURRENCY * len(self.clients)
+
+    def _connection(self):
+        # Connections must not cross a fork, so each process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.usage_db, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _legacy_usage(self, path=LEGACY_USAGE_FILE):
+        """{client_id: used} for today from the JSON file earlier versions kept"""
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                usage = json.load(f)
+        except Exception as e:
+            print(f"Warning: {path} not imported: {str(e)}")
+            return {}
+        return {client_id: entry['used'] for client_id, entry in usage.items() if entry.get('day') == self._day}
+
+    def _import_legacy_usage(self):
+        """Today's counts from the legacy JSON file, unless already in the table"""
+        self._connection().executemany(
+            "INSERT OR IGNORE INTO prokerala_usage (client_id, day, used) VALUES (?, ?, ?)",
+            [(client_id, self._day, used) for client_id, used in self._legacy_usage().items()]
+        )
+
+    def _read_usage(self):
+        """{client_id: used} for today from the table; read-only instances don't create the database"""
+        if not self.read_only:
+            rows = self._connection().execute("SELECT client_id, used FROM prokerala_usage WHERE day=?", (self._day,))
+            return dict(rows.fetchall())
+        if not os.path.exists(self.usage_db):
+            return {}
+        uri = f"file:{urllib.parse.quote(os.path.abspath(self.usage_db))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT)
+        try:
+            rows = conn.execute("SELECT client_id, used FROM prokerala_usage WHERE day=?", (self._day,))
+            return dict(rows.fetchall())
+        except sqlite3.OperationalError:
+            return {}  # No usage table yet: nothing spent through this database
+        finally:
+            conn.close()
+
+    def _load_usage(self):
+        """Every client's credits spent today, by all processes sharing the table"""
+        used = self._read_usage()
+        if self.read_only:
+            # What a writable instance would import on open
+            used = {**self._legacy_usage(), **used}
+        for client in self.clients:
+            client.used = used.get(client.id, 0)
+
+    def _reserve(self, client, credits):
+        """Add credits to the client's count unless that would go past its daily budget
+
+        One UPDATE, so processes sharing the table can't both take the last credit.
+        Refreshes client.used either way.
+        """
+        conn = self._connection()
+        conn.execute("INSERT OR IGNORE INTO prokerala_usage (client_id, day, used) VALUES (?, ?, 0)",
+                     (client.id, self._day))
+        reserved = conn.execute(
+            "UPDATE prokerala_usage SET used = used + ? WHERE client_id=? AND day=? AND used + ? <= ?",
+            (credits, client.id, self._day, credits, client.daily_credits)
+        ).rowcount == 1
+        client.used = conn.execute("SELECT used FROM prokerala_usage WHERE client_id=? AND day=?",
+                                   (client.id, self._day)).fetchone()[0]
+        return reserved
+
+    def _roll_day(self):
+        if _today() != self._day:
+            self._day = _today()
+            self._exhausted = False
+            self._load_usage()
+
+    def acquire(self, credits=CREDITS_PER_REQUEST):
+        """Reserve one request on the healthy client with the most credits left
+
+        Blocks while every usable client is at its per-minute limit or backing off.
+        None when all clients are out of credits or unavailable, when the soonest
+        one is paused for longer than the maximum backoff delay, or when
+        request_budget is spent.
+        """
+        with self._changed:
+            while True:
+                if self.request_budget is not None and self.request_budget < 1:
+                    self.refusals += 1
+                    return None
+                self._roll_day()
+                usable = [c for c in self.clients if c.healthy and c.remaining() >= credits]
+                if not usable:
+                    self.retry_at = _next_reset()
+                    if not self._exhausted:
+                        print(f"No Prokerala client is usable ({self._unusable_summary(credits)}); "
+                              "remaining requests use fallback data")
+                        self._exhausted = True
+                    self.refusals += 1
+                    return None
+                now = time.monotonic()
+                ready = [c for c in usable if c.next_slot(now) <= now]
+                if ready:
+                    client = max(ready, key=lambda c: c.remaining())
+                    if not self._reserve(client, credits):
+                        continue  # Another process spent its credits; pick again with the fresh count
+                    client.recent.append(now)
+                    self.requests += 1
+                    if self.request_budget is not None:
+                        self.request_budget -= 1
+                    return client
+                wait = min(c.next_slot(now) for c in usable) - now
+                if wait > self.backoff.max_delay:
+                    self.retry_at = time.time() + wait
+                    print(f"All Prokerala clients paused for {wait:.0f}s; using fallback data")
+                    self.refusals += 1
+                    return None
+                self._changed.wait(wait)
+
+    def _unusable_summary(self, credits):
+        """Why no client can take a request: disabled ones (e.g. bad credentials) apart from spent ones"""
+        disabled = [c for c in self.clients if not c.healthy]
+        spent = [c for c in self.clients if c.healthy and c.remaining() < credits]
+        parts = []
+        if spent:
+            parts.append(f"{len(spent)} out of credits until the daily reset")
+        if disabled:
+            reasons = sorted({c.disabled_reason for c in disabled})
+            parts.append(f"{len(disabled)} disabled: {', '.join(reasons)}; check their id and secret")
+        return "; ".join(parts)
+
+    def record_success(self, client, headers=None):
+        """Close the client's circuit; pause it until the reset when it reports no requests left"""
+        retry_after = retry_after_seconds(headers or {})
+        with self._changed:
+            client.failures = 0
+            client.paused_until = time.monotonic() + retry_after if retry_after else 0.0
+
+    def record_failure(self, client, retry_after=None):
+        """Back the client off after a 429 / 5xx, opening its circuit after repeated failures"""
+        with self._changed:
+            client.failures += 1
+            wait = self.backoff.delay(client.failures, retry_after)
+            if client.failures >= CIRCUIT_THRESHOLD:
+                wait = max(wait, self.backoff.max_delay)
+                print(f"Circuit open for client {client.number} for {wait:.0f}s after {client.failures} failures")
+            client.paused_until = time.monotonic() + wait
+            self._changed.notify_all()
+
+    def refund(self, client, credits=CREDITS_PER_REQUEST):
+        """Return a reservation that never reached the API"""
+        with self._changed:
+            conn = self._connection()
+            conn.execute("UPDATE prokerala_usage SET used = MAX(0, used - ?) WHERE client_id=? AND day=?",
+                         (credits, client.id, self._day))
+            self._load_usage()
+            self.requests -= 1
+            if self.request_budget is not None:
+                self.request_budget += 1
+            self._changed.notify_all()
+
+    def get_access_token(self, client):
+        """Cached bearer token for the client; marks it unhealthy when the token request fails"""
+        with client.token_lock:
+            if client.token and datetime.now() < client.token_expiry:
+                return client.token
+
+            print(f"Using client {client.number}/{len(self.clients)}")
+            response = http_client.post(
+                PROKERALA_TOKEN_URL,
+                data={
+                    'grant_type': 'client_credentials',
+                    'client_id': client.id,
+                    'client_secret': client.secret
+                }
+            )
+
+            if response.status_code != 200:
+                self.disable(client, f"token request failed ({response.status_code})")
+                return None
+
+            data = response.json()
+            client.token = data['access_token']
+            client.token_expiry = datetime.now() + timedelta(seconds=data['expires_in'] - 60)
+            return client.token
+
+    def disable(self, client, reason):
+        """Take a client out of rotation for the rest of the run"""
+        with self._changed:
+            client.healthy = False
+            client.disabled_reason = reason
+            client.token = None
+            self._changed.notify_all()
+        print(f"Client {client.number} disabled: {reason}")
+
+    def report(self):
+        with self._changed:
+            self._load_usage()
+        now = time.monotonic()
+        for client in self.clients:
+            status = '' if client.healthy else f' (disabled: {client.disabled_reason})'
+            if client.healthy and client.paused_until > now:
+                status = f' (paused {client.paused_until - now:.0f}s)'
+            print(f"Prokerala client {client.number}: {client.used}/{client.daily_credits} credits used today{status}")
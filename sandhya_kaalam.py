@@ -3,117 +3,92 @@
 # Version: 2.0 (With Persistent Caching)
 
 # Summary:
-# Generates .ics file for a given location and date range. Takes about 2 minutes
+# Generates .ics file for a given location and date range.
+# Sunrise/sunset is fetched one month per request and cached in ./panchangam_cache
+# (~12 requests for a year, none on a rerun), or computed offline with --sun-provider local.
 
 
 # [USAGE]:
 # python sandhya_kaalam.py "Mason, OH" --start-date 2025-01-01 --end-date 2025-12-31 --events sunrise sunset
+# python sandhya_kaalam.py "Mason, OH" --sun-provider local  # Offline sunrise/sunset, no API calls
 
 
-from datetime import datetime, timedelta
-from geopy.geocoders import Nominatim
-import requests
+from datetime import datetime
 import pytz
 import argparse
 import time  # <-- NEW IMPORT
 
+from cache_store import CACHE_BACKENDS, location_namespace, open_cache
+from day_table import SUN, day_strings, fill_noon, fill_sun, fill_sun_local, new_day_table, utc_stamps
+from geocoding import get_geocoder
+import http_client
+from ics_writer import escape_text, event_template, write_calendar
+from sunrise_api import get_sunrise_sunset_days
+
+SUN_PROVIDERS = ['api', 'local']
+NOON_MINUTES = (11 * 60 + 24, 10 * 60 + 48, 12 * 60)  # Noon midpoint, start and end, minutes after local midnight
+CACHE_DIR = "./panchangam_cache"  # Shared with sandhya_kaalam_panchangam.py
+
 def get_timezone(lat, lon):
-    geolocator = Nominatim(user_agent="my_geocoder")
-    location = geolocator.reverse(f"{lat},{lon}", exactly_one=True)
-    return pytz.timezone(location.raw['timezone']['tzid']) if location and 'timezone' in location.raw else pytz.utc
-
-def get_sunrise_sunset(lat, lon, date):
-    url = f"https://api.sunrise-sunset.org/json?lat={lat}&lng={lon}&formatted=0&date={date}"
-    response = requests.get(url)
-    if response.status_code == 200 and response.json()["status"] == "OK":
-        return response.json()["results"]
-    print(f"Error fetching data for {date}")
-    return None
-
-def create_ics_file(location, start_date, end_date, events):
-    geolocator = Nominatim(user_agent="my_geocoder")
-    location_data = geolocator.geocode(location)
+    return pytz.timezone(get_geocoder().timezone_name(lat, lon))
+
+def create_ics_file(location, start_date, end_date, events, sun_provider='api', cache_backend='pickle'):
+    location_data = get_geocoder().geocode(location)
 
     if not location_data:
         print("Error: Unable to geocode the location.")
         return
 
-    lat, lon = location_data.latitude, location_data.longitude
+    lat, lon = location_data
     timezone = get_timezone(lat, lon)
-    local_tz = timezone
-
-    ics_content = "BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:-//Sunrise Sunset Calendar//EN\n"
 
+    table = new_day_table(start_date, end_date)
     if 'sunrise' in events or 'sunset' in events:
-        current_day = start_date
-        delta = timedelta(days=1)
-        while current_day <= end_date:
-            date_str = current_day.strftime("%Y-%m-%d")
-            data = get_sunrise_sunset(lat, lon, date_str)
-            if data:
-                sunrise_time = datetime.fromisoformat(data["sunrise"])
-                sunset_time = datetime.fromisoformat(data["sunset"])
-
-                if 'sunrise' in events:
-                    sunrise_start = sunrise_time - timedelta(hours=1, minutes=12)
-                    sunrise_end = sunrise_time + timedelta(minutes=48)
-                    ics_content += generate_event(
-                        sunrise_start, sunrise_end, "ప్రాతః సంధ్యా సమయం", location, 
-                        date_str, "sunrise"
-                    )
-
-                if 'sunset' in events:
-                    sunset_start = sunset_time - timedelta(minutes=24)
-                    sunset_end = sunset_time + timedelta(hours=1, minutes=12)
-                    ics_content += generate_event(
-                        sunset_start, sunset_end, "సాయం సంధ్యా సమయం", location,
-                        date_str, "sunset"
-                    )
-            current_day += delta
-
+        # Offline provider computes the whole range in one vectorized call,
+        # the API is queried one month per request through the shared cache
+        if sun_provider == 'local':
+            fill_sun_local(table, lat, lon)
+        else:
+            cache = open_cache(cache_backend, CACHE_DIR)
+            cache_ns = location_namespace(lat, lon, timezone.zone)
+            fill_sun(table, get_sunrise_sunset_days(cache, cache_ns, lat, lon, start_date, end_date))
+            cache.flush()
     if 'noon' in events:
-        current_day = start_date.date()
-        end_day = end_date.date()
-        delta = timedelta(days=1)
-        while current_day <= end_day:
-            noon_start_naive = datetime.combine(current_day, datetime.strptime("10:48", "%H:%M").time())
-            noon_end_naive = datetime.combine(current_day, datetime.strptime("12:00", "%H:%M").time())
-            noon_start = local_tz.localize(noon_start_naive).astimezone(pytz.utc)
-            noon_end = local_tz.localize(noon_end_naive).astimezone(pytz.utc)
-            ics_content += generate_event(
-                noon_start, noon_end, "మాధ్యానిక సంధ్యా సమయం", location, current_day.strftime("%Y-%m-%d"), "noon"
-            )
-            current_day += delta
-
-    ics_content += "END:VCALENDAR"
+        fill_noon(table, timezone.zone, NOON_MINUTES)
 
     filename = f"{location.replace(' ', '_').replace(',', '')}_sandhya_kaalam_{start_date.year}.ics"
-    with open(filename, "w") as ics_file:
-        ics_file.write(ics_content)
+    write_calendar(filename, sandhya_events(location, table, events))
     print(f"ICS file '{filename}' created successfully.")
 
-def generate_event(start_time, end_time, summary, location, day_str, event_type):
-    event = [
-        "BEGIN:VEVENT",
-        f"UID:{start_time.strftime('%Y%m%dT%H%M%S')}@{event_type}",
-        f"DTSTAMP:{datetime.now().strftime('%Y%m%dT%H%M%SZ')}",
-        f"DTSTART:{start_time.strftime('%Y%m%dT%H%M%SZ')}",
-        f"DTEND:{end_time.strftime('%Y%m%dT%H%M%SZ')}",
-        f"SUMMARY:{summary} at {location}",
-        f"DESCRIPTION:{summary} at {location} on {day_str}.",
-        "BEGIN:VALARM",
-        "TRIGGER:-PT15M",
-        "ACTION:DISPLAY",
-        f"DESCRIPTION:Reminder: {summary} in 15 minutes.",
-        "END:VALARM",
-        "BEGIN:VALARM",
-        "TRIGGER:PT0M",
-        "ACTION:DISPLAY",
-        f"DESCRIPTION:Reminder: {summary} is starting now.",
-        "END:VALARM",
-        "END:VEVENT\n"
+
+def sandhya_events(location, table, events):
+    """Yield sunrise/sunset events for a day table, then the noon events (rendered bytes)"""
+    dates = day_strings(table)
+    windows = [
+        (event, summary, utc_stamps(table[event] + before), utc_stamps(table[event] + after))
+        for event, summary, before, after in (
+            ('sunrise', "ప్రాతః సంధ్యా సమయం", -72 * 60, 48 * 60),
+            ('sunset', "సాయం సంధ్యా సమయం", -24 * 60, 72 * 60),
+        ) if event in events
     ]
-    return "\n".join(event) + "\n"
+    if windows:
+        has_sun = (table['valid'] & SUN).tolist()
+        for i, date_str in enumerate(dates):
+            if has_sun[i]:
+                for event, summary, starts, ends in windows:
+                    yield generate_event(starts[i], ends[i], summary, location, date_str, event)
+
+    if 'noon' in events:
+        starts, ends = utc_stamps(table['noon_start']), utc_stamps(table['noon_end'])
+        for date_str, noon_start, noon_end in zip(dates, starts, ends):
+            yield generate_event(noon_start, noon_end, "మాధ్యానిక సంధ్యా సమయం", location, date_str, "noon")
+
+def generate_event(start_time, end_time, summary, location, day_str, event_type):
+    template = event_template(event_type, f"{summary} at {location}", (
+        ('-PT15M', f"Reminder: {summary} in 15 minutes."),
+        ('PT0M', f"Reminder: {summary} is starting now."),
+    ))
+    return template.render(start_time, end_time, escape_text(f"{summary} at {location} on {day_str}."))
 
 def main():
     start_time = time.time()  # <-- TIMING STARTS
@@ -127,9 +102,15 @@ def main():
                       default=datetime(2025, 12, 31), help="End date (YYYY-MM-DD). Default: 2025-12-31")
     parser.add_argument("--events", nargs='+', choices=['sunrise', 'noon', 'sunset'], 
                       default=['sunrise', 'sunset'], help="Events to include. Default: sunrise sunset")
+    parser.add_argument("--sun-provider", choices=SUN_PROVIDERS, default='api',
+                      help="Sunrise/sunset source: 'api' (sunrise-sunset.org) or 'local' (offline). Default: api")
+    parser.add_argument("--cache-backend", choices=CACHE_BACKENDS, default='pickle',
+                      help="Cache storage: 'pickle' files or one 'sqlite' database. Default: pickle")
     args = parser.parse_args()
 
-    create_ics_file(args.location.strip('"'), args.start_date, args.end_date, args.events)
+    create_ics_file(args.location.strip('"'), args.start_date, args.end_date, args.events, args.sun_provider,
+                    args.cache_backend)
+    http_client.print_connection_stats()
     
     # Calculate and print execution time
     end_time = time.time()  # <-- TIMING ENDS
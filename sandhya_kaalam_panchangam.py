@@ -5,19 +5,21 @@
 # [SUMMARY]:
 # Generates .ics file for a given location and date range
 # Shows the panchangam details in Telugu
-# Process multiple locations (run 1 location/day to stay within free tier limits)
+# Process multiple locations through a resumable job queue (panchangam_cache/jobs.sqlite3)
 
 # Cache Management Tips:
-# First Run: Processes all dates for a location (≈365 API calls)
+# First Run: Processes all dates for a location (≈365 API calls; --plan prints the exact count)
 # Subsequent Runs: Uses cached data, only fetches new dates
+# More Locations: Tithi/nakshatra boundaries are stored once as UTC instants and shared,
+# so each further location for the same dates needs (almost) no Prokerala calls
+# Warm the caches ahead of time with --prefetch [--budget N]; the calendar run then makes no calls
 # Clear Cache: Delete files in panchangam_cache directory
 
 # Partial Processing: Run individual locations as needed
 # Prokerala API Usage Strategy:
-# Day 1: Process 1 location (≈365 calls)
-# Day 2: Process next location (≈365 calls)
-# Continue until all 5 locations complete (within 5 days)
-# This implementation safely stays within free tier limits while allowing multi-location processing through persistent caching.
+# Every location becomes a queued job. When the day's credits run out the job is deferred
+# until they reset; rerun with --worker the next day (or from cron) to pick up where it stopped.
+# Interrupted runs resume the same way: fetched days are cached, only missing ones are fetched.
 
 
 
@@ -39,30 +41,58 @@
 #     --end-date 2025-01-31 \
 #     --debug  # Add this flag to see raw responses
 
+# python sandhya_kaalam_panchangam.py "Mason, OH" --sun-provider local  # Offline sunrise/sunset
+# python sandhya_kaalam_panchangam.py "Mason, OH" --sun-provider local --panchang-provider local  # Fully offline
+# python sandhya_kaalam_panchangam.py --worker  # Drain queued / deferred jobs (several workers may run at once)
+# python job_queue.py status                    # Show queued jobs and their checkpoints
+# python sandhya_kaalam_panchangam.py --backfill  # Refetch days written with fallback panchang, patch them in
+# python sandhya_kaalam_panchangam.py "Mason, OH" "Hyderabad, IN" --start-date 2025-01-01 --end-date 2025-12-31 --plan
+# python sandhya_kaalam_panchangam.py "Mason, OH" --start-date 2025-01-01 --end-date 2025-12-31 --prefetch --budget 100
+# python sandhya_kaalam_panchangam.py "Mason, OH" "Hyderabad, IN" --workers 4  # Build calendars on 4 processes
+# python sandhya_kaalam_panchangam.py "Mason, OH" --start-date 2025-01-01 --end-date 2034-12-31 --build-almanac almanac.bin
+# python sandhya_kaalam_panchangam.py "Mason, OH" --almanac almanac.bin  # Slice precomputed days, no caches or APIs
 
+
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from geopy.geocoders import Nominatim
 
+import functools
+import json
+import numpy as np
 import os
-import pickle
-import requests
 import pytz
 import argparse
 import time
 import toml
 
+from almanac import Almanac, write_almanac
+from cache_store import CACHE_BACKENDS, FLUSH_INTERVAL, location_namespace, open_cache
+from day_table import (EVENT_INDEX, EVENTS, NAKSHATRA_LABELS, NOON, PANCHANG, SUN, TITHI_LABELS, day_strings,
+                       degraded_rows, fill_noon, fill_sun_local, fill_sun_row, new_day_table, utc_stamps)
+from fetch_pipeline import FetchPipeline, HostLimit, estimated_seconds
+import http_client
+from ics_writer import escape_text, event_template, patch_calendar_days, write_calendar_days
+from geocoding import MIN_REQUEST_INTERVAL, get_geocoder
+from job_queue import QUEUE_DB_NAME, JobQueue
+from lunar_ephemeris import ugadi_for_year
+from offline_resolver import OfflineResolver
+from panchang_timeline import PanchangTimeline, load_intervals, local_timeline_intervals, store_intervals
+from prokerala_auth import CREDITS_PER_REQUEST, BackoffPolicy, ProkeralaAuth, retry_after_seconds
+from sunrise_api import fetch_sunrise_sunset_range, month_chunks
 
 # Configuration
 CACHE_DIR = "./panchangam_cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
+run_cache = open_cache('pickle', CACHE_DIR)  # Replaced in main() per --cache-backend
+offline_resolver = None  # Set in main() with --cities-file for zero-network location lookups
+almanac = None  # Set in main() with --almanac: precomputed day tables, no cache or network reads
 
-# Load secrets and initialize API client
-secrets = toml.load('multi_secrets.toml')
+# Load secrets and initialize API client (only needed for the Prokerala provider)
+SECRETS_FILE = 'multi_secrets.toml'
+secrets = toml.load(SECRETS_FILE) if os.path.exists(SECRETS_FILE) else {}
 
 # CLIENT_ID = secrets['api']['YOUR_CLIENT_ID']
 # CLIENT_SECRET = secrets['api']['YOUR_CLIENT_SECRET']
 
-PROKERALA_TOKEN_URL = "https://api.prokerala.com/token"
 PROKERALA_API_BASE = "https://api.prokerala.com/v2"
 
 # API limits for ProKerala
@@ -72,6 +102,32 @@ RATE_LIMIT_BASE_DELAY = 15  # Start with 15 seconds
 RATE_LIMIT_MAX_DELAY = 300  # 5 minutes max
 BACKOFF_FACTOR = 1.5
 
+# Per-host limits for the concurrent fetch stage (in-flight requests, requests/second)
+SUNRISE_HOST = 'api.sunrise-sunset.org'
+PROKERALA_HOST = 'api.prokerala.com'
+NOMINATIM_HOST = 'nominatim.openstreetmap.org'
+HOST_LIMITS = {
+    SUNRISE_HOST: HostLimit(concurrency=4, rate=5),
+    PROKERALA_HOST: HostLimit(concurrency=2, rate=1 / RATE_LIMIT_DELAY),  # Scaled to the client count in main()
+    NOMINATIM_HOST: HostLimit(concurrency=1, rate=1 / MIN_REQUEST_INTERVAL),
+}
+FETCH_CONCURRENCY = None  # Optional cap on in-flight requests per host (--fetch-concurrency)
+
+# Sunrise/sunset sources: sunrise-sunset.org API or the offline NOAA calculator
+SUN_PROVIDERS = ['api', 'local']
+
+# Noon event wall times, minutes after local midnight: panchang lookup, start, end
+NOON_MINUTES = (11 * 60 + 24, 10 * 60 + 48, 12 * 60 + 36)
+
+EVENT_SUMMARIES = {
+    'sunrise': "ప్రాతః సంధ్యా సమయం",
+    'sunset': "సాయం సంధ్యా సమయం",
+    'noon': "మాధ్యానిక సంధ్యా సమయం",
+}
+
+# Panchangam sources: Prokerala API or the offline Lahiri ephemeris
+PANCHANG_PROVIDERS = ['prokerala', 'local']
+
 # Vedic mappings
 VAARA_MAP = {
     'Sunday': 'భాను వారము',
@@ -94,6 +150,17 @@ VEDIC_MONTH_MAP = {
     9: 'ఆశ్వయుజ', 10: 'కార్తీక', 11: 'మార్గశిర', 12: 'పుష్య'
 }
 
+# Vaara by day table code (0 = Sunday) and ayana by code
+VAARA_NAMES = [VAARA_MAP[day] for day in
+               ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')]
+AYANA_NAMES = ['ఉత్తరాయణము', 'దక్షిణాయనము']
+
+PANCHANG_FALLBACK = {
+    'tithi': 'సమాచారం అందుబాటులో లేదు',
+    'nakshatra': 'N/A',
+    'vaara': 'N/A'
+}
+
 # 60 Samvatsara names
 SAMVATSARA = [
     'ప్రభవ', 'విభవ', 'శుక్ల', 'ప్రమోదుత', 'ప్రజోత్పత్తి',
@@ -111,145 +178,146 @@ SAMVATSARA = [
 ]
 
 
-class ProkeralaAuth:
-    def __init__(self, clients):
-        self.clients = clients
-        self.current_client = 0
-        self.token = None
-        self.token_expiry = None
-
-    def get_access_token(self):
-        if self.token and datetime.now() < self.token_expiry:
-            return self.token
-            
-        client = self.clients[self.current_client]
-        print(f"Using client {self.current_client+1}/{len(self.clients)}")
-        
-        response = requests.post(
-            PROKERALA_TOKEN_URL,
-            data={
-                'grant_type': 'client_credentials',
-                'client_id': client['id'],
-                'client_secret': client['secret']
-            }
-        )
-        
-        if response.status_code != 200:
-            self._rotate_client()
-            return self.get_access_token()
-            
-        data = response.json()
-        self.token = data['access_token']
-        self.token_expiry = datetime.now() + timedelta(seconds=data['expires_in'] - 60)
-        return self.token
-
-    def _rotate_client(self):
-        self.current_client = (self.current_client + 1) % len(self.clients)
-        self.token = None
-        print(f"Rotated to client {self.current_client+1}")
-    
-
-def get_cache_filename(location, cache_type):
-    """Generate sanitized cache filenames"""
-    sanitized = location.replace(' ', '_').replace(',', '')[:50]
-    return f"{CACHE_DIR}/{sanitized}_{cache_type}_cache.pkl"
-
-
-def load_cache(location, cache_type):
-    """Load cached data from file"""
-    cache_file = get_cache_filename(location, cache_type)
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'rb') as f:
-                return pickle.load(f)
-        except Exception as e:
-            print(f"Warning: Cache reset due to error: {str(e)}")
-    return {}
+def get_timezone(lat, lon):
+    return pytz.timezone((offline_resolver or get_geocoder()).timezone_name(lat, lon))
 
 
-def save_cache(location, cache_type, data):
-    """Save data to cache file"""
-    cache_file = get_cache_filename(location, cache_type)
-    with open(cache_file, 'wb') as f:
-        pickle.dump(data, f)
+def resolve_location(location):
+    """(lat, lon, timezone) from the alias table, the offline gazetteer or Nominatim"""
+    # Known spellings resolve from the alias table, new ones are geocoded and recorded
+    alias = run_cache.get_alias(location)
+    if alias:
+        return alias['lat'], alias['lon'], pytz.timezone(alias['tz'])
 
+    location_data = offline_resolver.geocode(location) if offline_resolver else None
+    if not location_data:
+        location_data = get_geocoder().geocode(location)
+    if not location_data:
+        return None
 
-def get_timezone(lat, lon):
-    geolocator = Nominatim(user_agent="my_geocoder")
-    location = geolocator.reverse(f"{lat},{lon}", exactly_one=True)
-    return pytz.timezone(location.raw['timezone']['tzid']) if location and 'timezone' in location.raw else pytz.utc
+    lat, lon = location_data
+    timezone = get_timezone(lat, lon)
+    run_cache.put_alias(location, lat, lon, timezone.zone)
+    return lat, lon, timezone
 
 
-def get_sunrise_sunset(lat, lon, date, location):
-    """Get sunrise/sunset data with persistent caching"""
-    cache = load_cache(location, 'sunrise')
+def get_sunrise_sunset(lat, lon, date, cache_ns):
+    """Get sunrise/sunset data with persistent caching (cache_ns from location_namespace)"""
     cache_key = (round(lat, 4), round(lon, 4), date)
+    cached = run_cache.get(cache_ns, 'sunrise', cache_key)
     
-    if cache_key in cache:
-        return cache[cache_key]
+    if cached is not None:
+        return cached
     
     url = f"https://api.sunrise-sunset.org/json?lat={lat}&lng={lon}&formatted=0&date={date}"
-    response = requests.get(url)
+    response = http_client.get(url)
     
     if response.status_code == 200 and response.json().get("status") == "OK":
         data = response.json()["results"]
-        cache[cache_key] = data
-        save_cache(location, 'sunrise', cache)
+        run_cache.put(cache_ns, 'sunrise', cache_key, data)
         return data
     
     print(f"Error fetching data for {date}")
     return None
 
 
-def get_vedic_details(date, ugadi_date):
-    """Get Vedic month, ayana, and samvatsara"""
-    ayana = 'ఉత్తరాయణము' if (date.month > 1 and date.month < 7) or \
-        (date.month == 1 and date.day >= 14) or \
-        (date.month == 7 and date.day < 14) else 'దక్షిణాయనము'
-    
-    year = ugadi_date.year if date >= ugadi_date else ugadi_date.year - 1
-    samvatsara_idx = (year - 1987) % 60
-    samvatsara = SAMVATSARA[samvatsara_idx] + ' నామ సంవత్సరం'
-
-    # Add vaara calculation
-    vaara = VAARA_MAP.get(date.strftime('%A'), date.strftime('%A'))
-    
-    return {
-        'samvatsara': samvatsara,
-        'ayana': ayana,
-        'masa': VEDIC_MONTH_MAP.get(date.month, ''),
-        'vaara': vaara
-    }
+def fill_vedic(table, ugadi_date):
+    """Masa, ayana and samvatsara codes of every day in a day table"""
+    days = table['day']
+    months = days.astype('datetime64[M]')
+    month = months.astype(int) % 12 + 1
+    day_of_month = (days - months).astype(int) + 1
+    uttarayana = ((month > 1) & (month < 7)) | \
+        ((month == 1) & (day_of_month >= 14)) | \
+        ((month == 7) & (day_of_month < 14))
+    table['ayana'] = np.where(uttarayana, 0, 1)
+    table['masa'] = month
+
+    # Each year's samvatsara starts at its Ugadi: ugadi_date for its own year, computed for the others
+    years = np.arange(days[0].astype('datetime64[Y]').astype(int) + 1969,
+                      days[-1].astype('datetime64[Y]').astype(int) + 1971)
+    ugadis = np.array([ugadi_date.strftime("%Y-%m-%d") if year == ugadi_date.year else str(ugadi_for_year(year))
+                       for year in years.tolist()], dtype='datetime64[D]')
+    year = years[np.searchsorted(ugadis, days, side='right') - 1]
+    table['samvatsara'] = (year - 1987) % 60
+
+
+@functools.lru_cache(maxsize=4096)
+def vedic_fragments(samvatsara, ayana, masa, vaara):
+    """Escaped description lines for a day's vedic codes (shared by every event and location)
+
+    Returns (samvatsara + ayana + masa lines, vaara line).
+    """
+    head = escape_text(
+        f"సంవత్సరము: {SAMVATSARA[samvatsara]} నామ సంవత్సరం\n"
+        f"అయనము: {AYANA_NAMES[ayana]}\n"
+        f"మాసము: {VEDIC_MONTH_MAP.get(masa, '')}\n"
+    )
+    return head, escape_text(f"వారము: {VAARA_NAMES[vaara]}\n")
 
 
-def get_panchangam_details(lat, lon, event_time, tz, location, auth):
+def get_panchangam_details(lat, lon, event_time, tz, cache_ns, auth):
     """Get panchangam details with robust error handling
     
     Key Features:
-    1. Multi-Client Rotation: Automatically switches API credentials when hitting rate limits
-    2. Exponential Backoff: Starts with 15s delay, doubles each retry (15s → 30s → 60s → 120s → 240s)
+    1. Multi-Client Scheduling: Each attempt goes to the healthy client with the most daily credits left
+    2. Exponential Backoff: RATE_LIMIT_BASE_DELAY x BACKOFF_FACTOR per failure, capped at RATE_LIMIT_MAX_DELAY,
+       with jitter; Retry-After / X-RateLimit-Reset from the server take precedence
     3. Robust Error Handling:
-    4. Handles HTTP errors (429, 500, etc.)
+    4. Handles HTTP errors: 429 / 5xx back off only the client that got them, repeated ones open its circuit
     5. Validates JSON structure
     6. Graceful fallbacks for missing data
-    7. Caching: Stores successful responses to minimize API calls
+    7. Caching: Stores successful responses once, as UTC boundaries every location shares
     8. Debugging: Logs truncated response bodies for troubleshooting
     9. Timeouts: Fails fast with 10-second timeout
+    10. Day timeline: Returns every tithi/nakshatra interval of the day (start, end, label),
+        so one call answers sunrise, noon and sunset lookups. None when all retries fail.
 
     """
-    cache = load_cache(location, 'panchangam')
-    cache_key = (round(lat, 4), round(lon, 4), event_time.date().isoformat(), tz)
-    
-    if cache_key in cache:
-        return cache[cache_key]
+    # Per-location entries cached before the global store still answer lookups
+    cache_key = panchang_cache_key(lat, lon, event_time, tz)
+    cached = run_cache.get(cache_ns, 'timeline', cache_key)
     
+    if cached is not None:
+        return cached
+
+    data = fetch_panchangam_day(lat, lon, event_time, tz, auth)
+    if data is not None:
+        store_intervals(run_cache, event_time, data)
+    return data
+
+
+def panchang_cache_key(lat, lon, event_time, tz):
+    return (round(lat, 4), round(lon, 4), event_time.date().isoformat(), tz)
+
+
+def fetch_panchangam_day(lat, lon, event_time, tz, auth):
+    """Prokerala request with retries, parsed into the day's intervals (no caching, thread-safe)"""
     for attempt in range(MAX_RETRIES):
+        client = auth.acquire()
+        if client is None:
+            return None
+
+        try:
+            access_token = auth.get_access_token(client)
+        except Exception as e:
+            # Network error on the token request: nothing reached the panchang endpoint
+            auth.refund(client)
+            print(f"Attempt {attempt+1} failed: token request: {str(e)}")
+            if attempt < MAX_RETRIES - 1:
+                delay = auth.backoff.delay(attempt + 1)
+                print(f"Retrying in {delay:.0f}s...")
+                time.sleep(delay)
+            continue
+        if access_token is None:
+            auth.refund(client)
+            continue  # Client is out of rotation now; retry straight away on another
+
         try:
-            access_token = auth.get_access_token()
             headers = {'Authorization': f'Bearer {access_token}'}
             
             # Remove manual encoding
-            response = requests.get(
+            response = http_client.get(
                 f"{PROKERALA_API_BASE}/astrology/panchang",
                 params={
                     'ayanamsa': 1,
@@ -261,6 +329,12 @@ def get_panchangam_details(lat, lon, event_time, tz, location, auth):
                 headers=headers,
                 timeout=10
             )
+            if response.status_code == 401:
+                client.token = None  # Token revoked or expired early; fetch a new one next time
+            if response.status_code == 429 or response.status_code >= 500:
+                auth.record_failure(client, retry_after_seconds(response.headers))
+                print(f"Attempt {attempt+1} failed: HTTP {response.status_code} from client {client.number}")
+                continue  # acquire() waits for a client that isn't backing off
             response.raise_for_status()
             result = response.json()
 
@@ -271,183 +345,755 @@ def get_panchangam_details(lat, lon, event_time, tz, location, auth):
             # Handle API response structure
             panchang = result.get('data', {})
             
-            # Extract tithi (first element of list)
-            tithi = panchang.get('tithi', [{}])
-            paksha_en = tithi[0].get('paksha', '')
-            paksha_te = TITHI_PAKSHA_MAP.get(paksha_en, paksha_en)
-            tithi_str = f"{tithi[0].get(paksha_te, '')} {tithi[0].get('name', 'N/A')}".strip() if tithi else 'N/A'
-
-            # Extract nakshatra (first element of list)
-            nakshatra = panchang.get('nakshatra', [{}])
-            nakshatra_str = nakshatra[0].get('name', 'N/A') if nakshatra else 'N/A'
+            # Every tithi of the day with its start/end
+            tithi_intervals = []
+            for tithi in panchang.get('tithi', []):
+                paksha_en = tithi.get('paksha', '')
+                paksha_te = TITHI_PAKSHA_MAP.get(paksha_en, paksha_en)
+                tithi_str = f"{paksha_te} {tithi.get('name', 'N/A')}".strip()
+                tithi_intervals.append((tithi['start'], tithi['end'], tithi_str))
+
+            # Every nakshatra of the day with its start/end
+            nakshatra_intervals = [
+                (nakshatra['start'], nakshatra['end'], nakshatra.get('name', 'N/A'))
+                for nakshatra in panchang.get('nakshatra', [])
+            ]
 
             # Vaara is direct string value
             # Get Telugu vaara name
             # vaara_en = panchang.get('vaara', 'N/A')
             # vaara_te = VAARA_MAP.get(vaara_en, vaara_en)
 
-            # vaara = panchang.get('vaara', [{}])
-            # vaara_te = vaara[0].get('name', 'N/A') if vaara else 'N/A'
-
-            data = {
-                'tithi': tithi_str,
-                'nakshatra': nakshatra_str,
-                # 'vaara': vaara_te
+            auth.record_success(client, response.headers)
+            return {
+                'tithi': tithi_intervals,
+                'nakshatra': nakshatra_intervals,
             }
 
-            cache[cache_key] = data
-            save_cache(location, 'panchangam', cache)
-            return data
-
         except Exception as e:
             print(f"Attempt {attempt+1} failed: {str(e)}")
             if attempt < MAX_RETRIES - 1:
-                delay = 15 * (attempt + 1)
-                print(f"Retrying in {delay}s...")
+                delay = auth.backoff.delay(attempt + 1)
+                print(f"Retrying in {delay:.0f}s...")
                 time.sleep(delay)
-                auth._rotate_client()
-            else:
-                print("Max retries reached. Using fallback data.")
-                return {
-                    'tithi': 'సమాచారం అందుబాటులో లేదు',
-                    'nakshatra': 'N/A',
-                    'vaara': 'N/A'
-                }
-
-
-def generate_event(start_time, end_time, summary, location, day_str, event_type, panchangam, vedic_details):
-    """Generate calendar event with time-specific Panchangam"""
-    # Handle missing panchangam data
-    tithi = panchangam.get('tithi', 'సమాచారం అందుబాటులో లేదు') if panchangam else 'సమాచారం అందుబాటులో లేదు'
-    nakshatra = panchangam.get('nakshatra', 'N/A') if panchangam else 'N/A'
-    # vaara = panchangam.get('vaara', 'N/A') if panchangam else 'N/A'
-    
+
+    print("Max retries reached. Using fallback data.")
+    return None
+
+
+def lookup_panchangam(timeline, event_time, lat, lon, tz, cache_ns, auth):
+    """Resolve panchangam details for an instant from the timeline, fetching its day on a miss
+
+    None when no source covers the instant (the event falls back to PANCHANG_FALLBACK).
+    """
+    if not timeline.covers(event_time) and auth is not None:
+        intervals = get_panchangam_details(lat, lon, event_time, tz, cache_ns, auth)
+        if intervals:
+            timeline.extend(intervals)
+    return timeline.at(event_time)
+
+
+def sun_day_table(lat, lon, cache_ns, start_date, end_date, sun_provider, fetch=True, estimate=False):
+    """Day table with the range's sunrise and sunset filled in
+
+    Offline, the whole range is one vectorized call. From the API the cached days are
+    read, and with fetch a day missing from the cache is requested on its own. With
+    estimate, days missing from the cache use the offline times instead (planning).
+    """
+    table = new_day_table(start_date, end_date)
+    if sun_provider == 'local':
+        fill_sun_local(table, lat, lon)
+        return table
+    lat_r, lon_r = round(lat, 4), round(lon, 4)
+    for i, date_str in enumerate(day_strings(table)):
+        if fetch:
+            fill_sun_row(table, i, get_sunrise_sunset(lat, lon, date_str, cache_ns))
+        else:
+            fill_sun_row(table, i, run_cache.get(cache_ns, 'sunrise', (lat_r, lon_r, date_str)))
+    if estimate:
+        fill_sun_local(table, lat, lon, rows=(table['valid'] & SUN) == 0)
+    return table
+
+
+def lookup_times(table, i, events, timezone):
+    """(event, instant) of day i's panchang lookups in process_location, first lookup first
+
+    Sunrise and sunset are UTC. Noon stays in local time, since Prokerala requests and
+    per-location cache keys use its date.
+    """
+    row = table[i]
+    instants = []
+    if row['valid'] & SUN:
+        for event in ('sunrise', 'sunset'):
+            if event in events:
+                instants.append((event, datetime.fromtimestamp(int(row[event]), pytz.utc)))
+    if 'noon' in events and row['valid'] & NOON:
+        instants.append(('noon', datetime.fromtimestamp(int(row['noon']), timezone)))
+    return instants
+
+
+def sun_misses(lat, lon, cache_ns, start_date, end_date):
+    """Months of the range (first, last) with at least one uncached sunrise/sunset day"""
+    lat_r, lon_r = round(lat, 4), round(lon, 4)
+    months = []
+    for first, last in month_chunks(start_date, end_date):
+        month_days = [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+        if any(run_cache.get(cache_ns, 'sunrise', (lat_r, lon_r, day)) is None for day in month_days):
+            months.append((first, last))
+    return months
+
+
+def panchang_misses(lat, lon, timezone, cache_ns, start_date, end_date, events, sun_provider, estimate=False):
+    """Anchors of the days in the range with a lookup no stored interval covers, and the number of days with lookups
+
+    A day counts as covered when every one of its lookup instants falls inside the
+    global store, whichever location's fetch put it there. Instants come from the
+    cached (or offline) sunrise. With estimate, days whose sunrise isn't cached yet use
+    the offline sunrise instead, as a plan of what the run will fetch once it is.
+    """
+    table = sun_day_table(lat, lon, cache_ns, start_date, end_date, sun_provider, fetch=False, estimate=estimate)
+    if 'noon' in events:
+        fill_noon(table, timezone.zone, NOON_MINUTES)
+    delta = timedelta(days=1)
+    coverage = load_intervals(run_cache, (start_date - delta).date(), (end_date + 2 * delta).date(),
+                              PanchangTimeline())
+    misses, needed = [], 0
+    for i in range(len(table)):
+        instants = [instant for _, instant in lookup_times(table, i, events, timezone)]
+        if instants:
+            needed += 1
+            legacy = run_cache.get(cache_ns, 'timeline', panchang_cache_key(lat, lon, instants[0], timezone.zone))
+            if legacy:
+                coverage.extend(legacy)
+            uncovered = [instant for instant in instants if not coverage.covers(instant)]
+            if uncovered:
+                misses.append(uncovered[0])
+    return misses, needed
+
+
+def prefetch_location(lat, lon, timezone, cache_ns, start_date, end_date, events, auth, sun_provider,
+                      max_concurrency=FETCH_CONCURRENCY, budget=None):
+    """Work out every cache miss for the range and fetch them concurrently
+
+    Stage 1 fills sunrise/sunset months with missing days, stage 2 needs those
+    sunrise times to anchor one Prokerala request per day with a panchang miss.
+    At most budget HTTP requests are sent (all misses when None), Prokerala retries
+    included; returns how many were.
+    """
+    lat_r, lon_r = round(lat, 4), round(lon, 4)
+    spent = 0
+
+    if sun_provider == 'api':
+        def store_sun(days):
+            for day, data in days.items():
+                run_cache.put(cache_ns, 'sunrise', (lat_r, lon_r, day), data)
+
+        pipeline = FetchPipeline(HOST_LIMITS, max_concurrency)
+        for first, last in sun_misses(lat, lon, cache_ns, start_date, end_date)[:budget]:
+            pipeline.add(SUNRISE_HOST, fetch_sunrise_sunset_range, lat, lon, first, last, on_result=store_sun)
+        spent += len(pipeline)  # One request per month
+        pipeline.run()
+
+    if auth is None:
+        return spent
+
+    misses, _ = panchang_misses(lat, lon, timezone, cache_ns, start_date, end_date, events, sun_provider)
+    remaining = None if budget is None else budget - spent
+    # Once acquire() refuses (credits, budget or every client gone), the days still queued
+    # would only wait out a rate-limit slot to be refused too
+    refused = auth.refusals
+    pipeline = FetchPipeline(HOST_LIMITS, max_concurrency, cancelled=lambda: auth.refusals > refused)
+    for anchor in misses[:remaining]:
+        store = functools.partial(store_intervals, run_cache, anchor)
+        pipeline.add(PROKERALA_HOST, fetch_panchangam_day, lat, lon, anchor, timezone.zone, auth,
+                     on_result=store)
+    # Every attempt reserves a request through acquire(), so retries count against the budget too
+    sent = auth.requests
+    auth.request_budget = remaining
+    try:
+        pipeline.run()
+    finally:
+        auth.request_budget = None
+    return spent + auth.requests - sent
+
+
+def client_allocation(auth, calls):
+    """Prokerala calls per client number as acquire() would spread them today, and the calls left over"""
+    remaining = {client.number: client.remaining() if client.healthy else 0 for client in auth.clients}
+    planned = dict.fromkeys(remaining, 0)
+    for _ in range(calls):
+        number = max(remaining, key=remaining.get)
+        if remaining[number] < CREDITS_PER_REQUEST:
+            break
+        remaining[number] -= CREDITS_PER_REQUEST
+        planned[number] += 1
+    return planned, calls - sum(planned.values())
+
+
+def format_duration(seconds):
+    hours, rem = divmod(int(round(seconds)), 3600)
+    minutes, seconds = divmod(rem, 60)
+    return f"{hours}h{minutes:02}m{seconds:02}s" if hours else f"{minutes}m{seconds:02}s"
+
+
+def plan_run(locations, start_date, end_date, events, sun_provider, panchang_provider, auth):
+    """Dry run: cache coverage, API calls per provider and Prokerala client, and estimated wall time"""
+    print(f"\nPlan for {start_date:%Y-%m-%d}..{end_date:%Y-%m-%d} ({', '.join(events)}):")
+    sun_calls = sun_months = panchang_calls = panchang_days = 0
+    for location in locations:
+        resolved = resolve_location(location)
+        if not resolved:
+            print(f"  {location}: geocoding failed, skipped")
+            continue
+        lat, lon, timezone = resolved
+        cache_ns = location_namespace(lat, lon, timezone.zone)
+        run_cache.adopt_legacy(location, cache_ns, ['sunrise', 'timeline'], save=False)  # A dry run writes nothing
+        parts = []
+        if sun_provider == 'api':
+            months = sum(1 for _ in month_chunks(start_date, end_date))
+            misses = len(sun_misses(lat, lon, cache_ns, start_date, end_date))
+            sun_calls, sun_months = sun_calls + misses, sun_months + months
+            parts.append(f"sunrise-sunset {misses}/{months} months to fetch")
+        if panchang_provider == 'prokerala':
+            misses, needed = panchang_misses(lat, lon, timezone, cache_ns, start_date, end_date, events,
+                                             sun_provider, estimate=True)
+            panchang_calls, panchang_days = panchang_calls + len(misses), panchang_days + needed
+            parts.append(f"prokerala {len(misses)}/{needed} days to fetch")
+        print(f"  {location}: {', '.join(parts) or 'fully offline, no API calls'}")
+
+    print("\nCache coverage:")
+    if sun_provider == 'api' and sun_months:
+        print(f"  sunrise-sunset: {100 * (sun_months - sun_calls) / sun_months:.0f}% "
+              f"({sun_months - sun_calls} of {sun_months} months cached)")
+    if panchang_provider == 'prokerala' and panchang_days:
+        print(f"  prokerala: {100 * (panchang_days - panchang_calls) / panchang_days:.0f}% "
+              f"({panchang_days - panchang_calls} of {panchang_days} days cached)")
+    print(f"API calls: {sun_calls} sunrise-sunset, {panchang_calls} prokerala")
+
+    wall = {'sunrise-sunset': estimated_seconds(HOST_LIMITS[SUNRISE_HOST], sun_calls)}
+    if panchang_calls and auth is not None:
+        planned, left_over = client_allocation(auth, panchang_calls)
+        print("Prokerala clients:")
+        for client in auth.clients:
+            status = '' if client.healthy else ' (disabled)'
+            print(f"  client {client.number}: {client.remaining()} credits left today, {planned[client.number]} calls{status}")
+        # Every client sends at its own per-minute rate, in parallel with the others
+        wall['prokerala'] = max(
+            estimated_seconds(HostLimit(concurrency=1, rate=client.rate_per_minute / 60, burst=client.rate_per_minute),
+                              planned[client.number])
+            for client in auth.clients
+        )
+        if left_over:
+            per_day = sum(client.daily_credits for client in auth.clients if client.healthy) // CREDITS_PER_REQUEST
+            days = -(-left_over // per_day) if per_day else None
+            print(f"  {left_over} calls exceed today's credits; the job queue defers them "
+                  f"({'about ' + str(days) + ' more days' if days else 'no healthy clients'} at {per_day} calls/day)")
+    print(f"Estimated wall time: {format_duration(sum(wall.values()))} ("
+          + ", ".join(f"{host} {format_duration(seconds)}" for host, seconds in wall.items()) + ")")
+
+
+def prefetch_run(locations, start_date, end_date, events, sun_provider, panchang_provider, auth, budget,
+                 fetch_concurrency=FETCH_CONCURRENCY):
+    """Warm the caches for every location within a budget of API calls, without writing calendars"""
+    spent = 0
+    for location in locations:
+        if budget is not None and spent >= budget:
+            print(f"Call budget of {budget} spent; stopping before {location}")
+            break
+        resolved = resolve_location(location)
+        if not resolved:
+            print(f"Skipping {location} - geocoding failed")
+            continue
+        lat, lon, timezone = resolved
+        cache_ns = location_namespace(lat, lon, timezone.zone)
+        run_cache.adopt_legacy(location, cache_ns, ['sunrise', 'timeline'])
+        print(f"\nPrefetching {location}...")
+        spent += prefetch_location(lat, lon, timezone, cache_ns, start_date, end_date, events,
+                                   auth if panchang_provider == 'prokerala' else None, sun_provider,
+                                   fetch_concurrency, None if budget is None else budget - spent)
+    print(f"\nPrefetch made {spent} API calls" + (f" of a budget of {budget}" if budget is not None else ""))
+    plan_run(locations, start_date, end_date, events, sun_provider, panchang_provider, auth)
+
+
+def generate_event(start_time, end_time, summary, location, day_str, event_type, tithi, nakshatra, fragments, uid):
+    """Rendered calendar event with time-specific Panchangam"""
+    head, vaara = fragments
     description = (
-        f"{summary} at {location} on {day_str}\n"
-        f"సంవత్సరము: {vedic_details['samvatsara']}\n"
-        f"అయనము: {vedic_details['ayana']}\n"
-        f"మాసము: {vedic_details['masa']}\n"
-        f"తిథి: {tithi}\n"
-        f"వారము: {vedic_details['vaara']}\n"  # {vaara}\n"
-        f"నక్షత్రము: {nakshatra}\n"
+        escape_text(f"{summary} at {location} on {day_str}\n") + head +
+        escape_text(f"తిథి: {tithi}\n") + vaara +
+        escape_text(f"నక్షత్రము: {nakshatra}\n")
     )
-    
-    event = [
-        "BEGIN:VEVENT",
-        f"UID:{start_time.strftime('%Y%m%dT%H%M%S')}@{event_type}",
-        f"DTSTAMP:{datetime.now().strftime('%Y%m%dT%H%M%SZ')}",
-        f"DTSTART:{start_time.strftime('%Y%m%dT%H%M%SZ')}",
-        f"DTEND:{end_time.strftime('%Y%m%dT%H%M%SZ')}",
-        f"SUMMARY:{summary} at {location}",
-        f"DESCRIPTION:{description}",
-        "BEGIN:VALARM",
-        "TRIGGER:-PT15M",
-        "ACTION:DISPLAY",
-        f"DESCRIPTION:Reminder: {summary} in 10 minutes.",
-        "END:VALARM",
-        "BEGIN:VALARM",
-        "TRIGGER:PT0M",
-        "ACTION:DISPLAY",
-        f"DESCRIPTION:Reminder: {summary} is starting now.",
-        "END:VALARM",
-        "END:VEVENT\n"
-    ]
-    return "\n".join(event) + "\n"
-
-
-def process_location(location, start_date, end_date, events, ugadi_date, auth):
-    """Process one location and generate its ICS file"""
-    geolocator = Nominatim(user_agent="multi_loc_panchangam")
-    location_data = geolocator.geocode(location)
 
-    if not location_data:
-        print(f"Skipping {location} - geocoding failed")
-        return
+    # SUMMARY, alarms and DTSTAMP are compiled once per (event type, location)
+    template = event_template(event_type, f"{summary} at {location}", (
+        ('-PT15M', f"Reminder: {summary} in 10 minutes."),
+        ('PT0M', f"Reminder: {summary} is starting now."),
+    ))
+    return template.render(start_time, end_time, description, uid)
 
-    lat, lon = location_data.latitude, location_data.longitude
-    timezone = get_timezone(lat, lon)
-    tz_str = timezone.zone
 
-    ics_content = "BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:-//Sunrise Sunset Calendar//EN\n"
+def process_location(location, start_date, end_date, events, ugadi_date, auth, sun_provider='api',
+                     panchang_provider='prokerala', fetch_concurrency=FETCH_CONCURRENCY, on_day=None,
+                     ledger=None):
+    """Process one location and generate its ICS file
+
+    on_day(date_str) is called after each day's events are built. Days written with
+    fallback panchang data are recorded in ledger (a JobQueue) for --backfill.
+    Returns False when the location can't be geocoded.
+    """
+    stored = almanac_location(location, start_date, end_date, events, ugadi_date, sun_provider,
+                              panchang_provider)
+    if stored is not None:
+        lat, lon, timezone, table = stored
+        cache_ns = location_namespace(lat, lon, timezone.zone)
+        print(f"Using almanac '{almanac.path}' for {location}")
+    else:
+        resolved = resolve_location(location)
+
+        if not resolved:
+            print(f"Skipping {location} - geocoding failed")
+            return False
+
+        lat, lon, timezone = resolved
+        table = None
+
+        # Caches are keyed by coordinates + timezone, shared by every spelling of the place
+        cache_ns = location_namespace(lat, lon, timezone.zone)
+        run_cache.adopt_legacy(location, cache_ns, ['sunrise', 'timeline'])
+
+        # Fetch all misses up front, concurrently; the day loop then reads from cache
+        prefetch_location(lat, lon, timezone, cache_ns, start_date, end_date, events,
+                          auth if panchang_provider == 'prokerala' else None, sun_provider, fetch_concurrency)
+
+    filename = calendar_filename(location, start_date)
+    degraded_days = []
+
+    def day_done(date_str, degraded):
+        if degraded:
+            degraded_days.append(date_str)
+        if on_day is not None:
+            on_day(date_str)
+
+    # Events are streamed to disk as each day is built; unchanged days are copied from the last run
+    began = time.perf_counter()
+    count, changed = write_calendar_days(filename, location_events(
+        location, lat, lon, timezone, cache_ns, start_date, end_date, events, ugadi_date, auth,
+        sun_provider, panchang_provider, day_done, table
+    ))
+    elapsed = time.perf_counter() - began
+
+    if ledger is not None:
+        params = {
+            'events': events,
+            'ugadi_date': ugadi_date.strftime("%Y-%m-%d"),
+            'sun_provider': sun_provider,
+            'panchang_provider': panchang_provider,
+            'start_date': start_date.strftime("%Y-%m-%d"),
+            'end_date': end_date.strftime("%Y-%m-%d"),
+        }
+        ledger.record_degraded(filename, location, params, params['start_date'], params['end_date'], degraded_days)
+    if degraded_days:
+        print(f"{len(degraded_days)} days used fallback panchang data; run --backfill when quota is available")
+
+    if changed:
+        print(f"ICS file '{filename}' written ({changed} days added or changed).")
+    else:
+        print(f"ICS file '{filename}' is up to date.")
+    print(f"{count} events in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} events/s)")
+    print(f"Completed processing for {location}")
+    return True
+
+
+def calendar_filename(location, start_date):
+    return f"{location.replace(' ', '_').replace(',', '')}_sandhya_kaalam_panchangam_{start_date.year}.ics"
+
 
-    current_day = start_date
+def location_day_table(lat, lon, timezone, cache_ns, start_date, end_date, events, ugadi_date, auth,
+                       sun_provider, panchang_provider):
+    """Day table of one location with every column its calendar needs"""
+    tz_str = timezone.zone
+    table = sun_day_table(lat, lon, cache_ns, start_date, end_date, sun_provider)
+    if 'noon' in events:
+        fill_noon(table, tz_str, NOON_MINUTES)
+    fill_vedic(table, ugadi_date)
+
+    # Tithi/nakshatra intervals: computed once for the padded range offline, otherwise
+    # read from the global store, and one Prokerala call per day on a lookup that misses
     delta = timedelta(days=1)
-    
-    while current_day <= end_date:
-        date_str = current_day.strftime("%Y-%m-%d")
-        vedic_details = get_vedic_details(current_day, ugadi_date)
-        
-        # Get sunrise/sunset times
-        ss_data = get_sunrise_sunset(lat, lon, date_str, location)
-        
-        # Process events
-        if ss_data:
-            # Sunrise event
-            if 'sunrise' in events:
-                sunrise_time = datetime.fromisoformat(ss_data["sunrise"].replace('Z', '+00:00'))
-                sunrise_panchang = get_panchangam_details(lat, lon, sunrise_time, tz_str, location, auth=auth)
-                sunrise_start = sunrise_time - timedelta(hours=1, minutes=12)
-                sunrise_end = sunrise_time + timedelta(minutes=48)
-                ics_content += generate_event(
-                    sunrise_start, sunrise_end, 
-                    "ప్రాతః సంధ్యా సమయం", location, 
-                    date_str, "sunrise", sunrise_panchang, vedic_details
-                )
-
-            # Sunset event
-            if 'sunset' in events:
-                sunset_time = datetime.fromisoformat(ss_data["sunset"].replace('Z', '+00:00'))
-                sunset_panchang = get_panchangam_details(lat, lon, sunset_time, tz_str, location, auth=auth)
-                sunset_start = sunset_time - timedelta(minutes=24)
-                sunset_end = sunset_time + timedelta(hours=1, minutes=12)
-                
-                # Handle thithi transition
-                if sunrise_panchang and sunset_panchang:
-                    if sunrise_panchang['tithi'] != sunset_panchang['tithi']:
-                        sunset_panchang['tithi'] = f"{sunrise_panchang['tithi']} ప్రయుక్త {sunset_panchang['tithi']}"
-                
-                ics_content += generate_event(
-                    sunset_start, sunset_end,
-                    "సాయం సంధ్యా సమయం", location,
-                    date_str, "sunset", sunset_panchang, vedic_details
-                )
-
-        # Noon event
-        if 'noon' in events:
-            noon_time = datetime.combine(current_day.date(), datetime.strptime("11:24", "%H:%M").time())
-            noon_panchang = get_panchangam_details(lat, lon, noon_time, tz_str, location, auth=auth)
-            noon_start = timezone.localize(noon_time - timedelta(minutes=36)).astimezone(pytz.utc)
-            noon_end = timezone.localize(noon_time + timedelta(minutes=72)).astimezone(pytz.utc)
-            ics_content += generate_event(
-                noon_start, noon_end,
-                "మాధ్యానిక సంధ్యా సమయం", location,
-                date_str, "noon", noon_panchang, vedic_details
-            )
+    timeline = PanchangTimeline()
+    if panchang_provider == 'local':
+        timeline.extend(local_timeline_intervals(
+            timezone.localize(start_date - delta), timezone.localize(end_date + 2 * delta)
+        ))
+        auth = None
+    else:
+        load_intervals(run_cache, (start_date - delta).date(), (end_date + 2 * delta).date(), timeline)
+
+    for i in range(len(table)):
+        instants = lookup_times(table, i, events, timezone)
+
+        # Intervals cached per location before the global store existed
+        if instants and panchang_provider == 'prokerala':
+            cached = run_cache.get(cache_ns, 'timeline', panchang_cache_key(lat, lon, instants[0][1], tz_str))
+            if cached:
+                timeline.extend(cached)
+
+        for event, instant in instants:
+            details = lookup_panchangam(timeline, instant, lat, lon, tz_str, cache_ns, auth)
+            if details:
+                column = EVENT_INDEX[event]
+                table['tithi'][i, column] = TITHI_LABELS.code(details['tithi'])
+                table['nakshatra'][i, column] = NAKSHATRA_LABELS.code(details['nakshatra'])
+                table['valid'][i] |= PANCHANG[event]
+    return table
+
+
+def location_events(location, lat, lon, timezone, cache_ns, start_date, end_date, events, ugadi_date, auth,
+                    sun_provider, panchang_provider, on_day=None, table=None):
+    """Yield (date_str, [rendered sunrise / sunset / noon events]) for each day in date order
+
+    UIDs are the day, event type and location namespace, so an event keeps its UID when
+    its times or panchang change and calendar apps update it in place.
+    on_day(date_str, degraded) is called after each day; degraded when any of its
+    events fell back to PANCHANG_FALLBACK. table is a ready day table (e.g. from the
+    almanac); without one it is built from the caches and providers.
+    """
+    if table is None:
+        table = location_day_table(lat, lon, timezone, cache_ns, start_date, end_date, events, ugadi_date,
+                                   auth, sun_provider, panchang_provider)
+
+    # Whole columns are formatted at once; the day loop only assembles text
+    windows = {
+        'sunrise': (utc_stamps(table['sunrise'] - 72 * 60), utc_stamps(table['sunrise'] + 48 * 60)),
+        'sunset': (utc_stamps(table['sunset'] - 24 * 60), utc_stamps(table['sunset'] + 72 * 60)),
+        'noon': (utc_stamps(table['noon_start']), utc_stamps(table['noon_end'])),
+    }
+    valid = table['valid'].tolist()
+    degraded = degraded_rows(table, events).tolist()
+    tithi, nakshatra = table['tithi'].tolist(), table['nakshatra'].tolist()
+    vedic = zip(*(table[field].tolist() for field in ('samvatsara', 'ayana', 'masa', 'vaara')))
+
+    for i, (date_str, codes) in enumerate(zip(day_strings(table), vedic)):
+        fragments = vedic_fragments(*codes)
+        uid_day = date_str.replace('-', '')
+        day_events = []
+        tithis = {}
+
+        for event in EVENTS:
+            if event not in events or not valid[i] & (NOON if event == 'noon' else SUN):
+                continue
+            column = EVENT_INDEX[event]
+            tithis[event] = TITHI_LABELS.label(tithi[i][column], PANCHANG_FALLBACK['tithi'])
+            event_tithi = tithis[event]
+
+            # Handle thithi transition
+            if event == 'sunset' and 'sunrise' in tithis and tithis['sunrise'] != event_tithi:
+                event_tithi = f"{tithis['sunrise']} ప్రయుక్త {event_tithi}"
+
+            start, end = windows[event][0][i], windows[event][1][i]
+            day_events.append(generate_event(
+                start, end, EVENT_SUMMARIES[event], location, date_str, event,
+                event_tithi, NAKSHATRA_LABELS.label(nakshatra[i][column], PANCHANG_FALLBACK['nakshatra']),
+                fragments, f"{uid_day}-{event}@{cache_ns}"
+            ))
+
+        yield date_str, day_events
+        if on_day is not None:
+            on_day(date_str, degraded[i])
+
+
+def almanac_location(location, start_date, end_date, events, ugadi_date, sun_provider, panchang_provider):
+    """(lat, lon, timezone, day table) of a location from the almanac, None when it doesn't cover the request
+
+    Also None when any of the days has fallback panchang data for the events: the caches
+    may have those days by now (e.g. after --backfill), so the location is built from them.
+    """
+    if almanac is None or (almanac.sun_provider, almanac.panchang_provider) != (sun_provider, panchang_provider):
+        return None
+    index = almanac.find(location)
+    if index is None:
+        return None
+    table = almanac.day_table(index, start_date, end_date)
+    if table is None:
+        return None
+    degraded = int(degraded_rows(table, events).sum())
+    if degraded:
+        print(f"Almanac '{almanac.path}' has {degraded} days of fallback panchang data for {location}; "
+              "building it from the caches")
+        return None
+    entry = almanac.locations[index]
+    # The mapped rows are read-only; settings that differ from the build are refilled on a copy
+    if almanac.ugadi_date != ugadi_date.strftime("%Y-%m-%d"):
+        table = np.array(table)
+        fill_vedic(table, ugadi_date)
+    if almanac.noon_minutes != NOON_MINUTES:
+        table = np.array(table)
+        fill_noon(table, entry['tz'], NOON_MINUTES)
+    return entry['lat'], entry['lon'], pytz.timezone(entry['tz']), table
+
+
+def build_almanac(path, locations, start_date, end_date, ugadi_date, auth, sun_provider, panchang_provider,
+                  fetch_concurrency=FETCH_CONCURRENCY):
+    """Precompute every location's day table (all events) for the range into an almanac file"""
+    entries, tables = [], []
+    for location in locations:
+        resolved = resolve_location(location)
+        if not resolved:
+            print(f"Skipping {location} - geocoding failed")
+            continue
+        lat, lon, timezone = resolved
+        cache_ns = location_namespace(lat, lon, timezone.zone)
+        run_cache.adopt_legacy(location, cache_ns, ['sunrise', 'timeline'])
+        print(f"\nComputing {location}...")
+        location_auth = auth if panchang_provider == 'prokerala' else None
+        prefetch_location(lat, lon, timezone, cache_ns, start_date, end_date, EVENTS, location_auth,
+                          sun_provider, fetch_concurrency)
+        table = location_day_table(lat, lon, timezone, cache_ns, start_date, end_date, EVENTS, ugadi_date,
+                                   location_auth, sun_provider, panchang_provider)
+        degraded = int(degraded_rows(table).sum())
+        if degraded:
+            print(f"{degraded} days have fallback panchang data; rebuild when quota is available")
+        entries.append({'name': location, 'lat': lat, 'lon': lon, 'tz': timezone.zone})
+        tables.append(table)
+
+    size = write_almanac(path, entries, tables, {
+        'sun_provider': sun_provider,
+        'panchang_provider': panchang_provider,
+        'ugadi_date': ugadi_date.strftime("%Y-%m-%d"),
+        'noon_minutes': list(NOON_MINUTES),
+    })
+    print(f"Almanac '{path}' written: {len(entries)} locations, "
+          f"{start_date:%Y-%m-%d}..{end_date:%Y-%m-%d}, {size:,} bytes")
+
+
+def job_arguments(job):
+    """process_location keyword arguments for a queued job"""
+    params = job.params
+    return {
+        'location': job.location,
+        'start_date': datetime.strptime(job.start_date, "%Y-%m-%d"),
+        'end_date': datetime.strptime(job.end_date, "%Y-%m-%d"),
+        'events': params['events'],
+        'ugadi_date': datetime.strptime(params['ugadi_date'], "%Y-%m-%d"),
+        'sun_provider': params['sun_provider'],
+        'panchang_provider': params['panchang_provider'],
+    }
 
-        current_day += delta
 
-    ics_content += "END:VCALENDAR"
+def finish_job(queue, job, done, retry_at):
+    """Complete, defer (Prokerala gave up at retry_at) or fail a job after its run"""
+    if not done:
+        queue.fail(job, "geocoding failed")
+    elif retry_at is not None:
+        queue.defer(job, retry_at, "Prokerala quota exhausted or unavailable")
+        print(f"Job {job.id} deferred until {datetime.fromtimestamp(retry_at).strftime('%Y-%m-%d %H:%M')}")
+    else:
+        queue.checkpoint(job, job.end_date)
+        queue.complete(job)
 
-    filename = f"{location.replace(' ', '_').replace(',', '')}_sandhya_kaalam_panchangam_{start_date.year}.ics"
-    
-    with open(filename, "w", encoding='utf-8') as ics_file:
-        ics_file.write(ics_content)
 
-    print(f"ICS file '{filename}' created successfully.")
-    print(f"Completed processing for {location}")
+def prokerala_retry_at(job, auth):
+    """When Prokerala requests can succeed again if the job's run hit a limit, else None"""
+    if job.params['panchang_provider'] != 'prokerala':
+        return None
+    if auth is None:
+        return time.time() + 24 * 3600
+    return auth.retry_at
+
 
+def run_queue(queue, auth, fetch_concurrency=FETCH_CONCURRENCY, job_ids=None):
+    """Drain every job (or those in job_ids) that can run now, checkpointing each finished day"""
+    while True:
+        job = queue.claim(job_ids)
+        if job is None:
+            break
+
+        print(f"\nProcessing {job.location} (job {job.id}, attempt {job.attempts})...")
+        if job.checkpoint:
+            print(f"Resuming after {job.checkpoint}")
+        if auth is not None:
+            auth.retry_at = None
+
+        def checkpoint(day):
+            # Days after the quota ran out used fallback data and must be redone
+            if auth is None or auth.retry_at is None:
+                queue.checkpoint(job, day)
+
+        try:
+            with queue.leased(job):
+                done = process_location(auth=auth, fetch_concurrency=fetch_concurrency, on_day=checkpoint,
+                                        ledger=queue, **job_arguments(job))
+        except KeyboardInterrupt:
+            queue.release(job)
+            raise
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            queue.fail(job, e)
+            continue
+
+        finish_job(queue, job, done, prokerala_retry_at(job, auth))
+
+    print_queue_summary(queue)
+
+
+def init_calendar_worker(cache_backend, flush_interval, queue_db, almanac_path=None):
+    """Process pool initializer: open the shared cache backend, degraded-day ledger and almanac in the child"""
+    global run_cache, offline_resolver, worker_ledger, almanac
+    run_cache = open_cache(cache_backend, CACHE_DIR, flush_interval)
+    offline_resolver = None  # Locations were resolved by the parent and are in the alias table
+    worker_ledger = JobQueue(queue_db)
+    almanac = Almanac(almanac_path) if almanac_path else None  # Every worker maps the same pages
+
+
+def build_calendar(kwargs):
+    """Process pool task: one location's calendar from cached or offline data, no network"""
+    return process_location(auth=None, ledger=worker_ledger, **kwargs)
+
+
+def run_queue_parallel(queue, auth, workers, cache_backend, flush_interval, fetch_concurrency=FETCH_CONCURRENCY,
+                       job_ids=None):
+    """Fetch every runnable job's misses here, then build their calendars on a process pool
+
+    Network stays in this process (one ProkeralaAuth keeps the per-client budgets
+    honest); the CPU-bound day loops fan out over `workers` processes that read the
+    shared cache. Results are gathered in job order.
+    """
+    jobs = []
+    job = queue.claim(job_ids)
+    while job is not None:
+        jobs.append(job)
+        job = queue.claim(job_ids)
+    if not jobs:
+        print_queue_summary(queue)
+        return
+
+    with queue.leased(*jobs):
+        try:
+            # One job's failure (e.g. a geocoder timeout) fails only that job
+            retry_at = {}
+            runnable = []
+            for job in jobs:
+                try:
+                    retry_at[job.id] = prefetch_job(job, auth, fetch_concurrency)
+                except Exception as e:
+                    print(f"Job {job.id} failed: {str(e)}")
+                    queue.fail(job, e)
+                    continue
+                runnable.append(job)
+
+            results = []
+            if runnable:
+                print(f"\nBuilding {len(runnable)} calendars with {workers} workers...")
+                with ProcessPoolExecutor(max_workers=workers, initializer=init_calendar_worker,
+                                         initargs=(cache_backend, flush_interval, queue.db_path,
+                                                   almanac and almanac.path)) as pool:
+                    futures = [(job, pool.submit(build_calendar, job_arguments(job))) for job in runnable]
+                    for job, future in futures:
+                        try:
+                            results.append((job, future.result()))
+                        except Exception as e:
+                            print(f"Job {job.id} failed: {str(e)}")
+                            queue.fail(job, e)
+        except KeyboardInterrupt:
+            for job in jobs:
+                queue.release(job)  # No-op for jobs already failed
+            raise
+
+    for job, done in results:
+        print(f"{job.location}: {'done' if done else 'geocoding failed'}")
+        finish_job(queue, job, done, retry_at[job.id])
+    print_queue_summary(queue)
+
+
+def prefetch_job(job, auth, fetch_concurrency):
+    """Resolve a queued job's location and fetch its misses; returns its Prokerala retry time"""
+    kwargs = job_arguments(job)
+    if auth is not None:
+        auth.retry_at = None
+    if almanac_location(kwargs['location'], kwargs['start_date'], kwargs['end_date'], kwargs['events'],
+                        kwargs['ugadi_date'], kwargs['sun_provider'], kwargs['panchang_provider']) is not None:
+        return None  # Covered by the almanac, nothing to fetch
+    print(f"\nFetching {job.location} (job {job.id}, attempt {job.attempts})...")
+    resolved = resolve_location(job.location)
+    if resolved:
+        lat, lon, timezone = resolved
+        cache_ns = location_namespace(lat, lon, timezone.zone)
+        prefetch_location(lat, lon, timezone, cache_ns, kwargs['start_date'], kwargs['end_date'],
+                          kwargs['events'], auth if kwargs['panchang_provider'] == 'prokerala' else None,
+                          kwargs['sun_provider'], fetch_concurrency)
+    return prokerala_retry_at(job, auth)
+
+
+def backfill(queue, auth, fetch_concurrency=FETCH_CONCURRENCY):
+    """Refetch the panchang of every degraded day in the ledger and patch those days into their calendars"""
+    ledger = queue.degraded_days()
+    if not ledger:
+        print("No degraded days to backfill")
+        return
+
+    for (filename, location, params), days in ledger.items():
+        params = json.loads(params)
+        # Ledger rows written before the provider was recorded all came from Prokerala runs
+        panchang_provider = params.get('panchang_provider', 'prokerala')
+        location_auth = auth if panchang_provider == 'prokerala' else None
+        if panchang_provider == 'prokerala' and auth is None:
+            print(f"Skipping {filename} - no Prokerala clients in {SECRETS_FILE}")
+            continue
+        print(f"\nBackfilling {len(days)} days of {filename}...")
+        resolved = resolve_location(location)
+        if not resolved:
+            print(f"Skipping {location} - geocoding failed")
+            continue
+        lat, lon, timezone = resolved
+        cache_ns = location_namespace(lat, lon, timezone.zone)
+        ugadi_date = datetime.strptime(params['ugadi_date'], "%Y-%m-%d")
+        dates = [datetime.strptime(day, "%Y-%m-%d") for day in days]
+
+        # Only days without a cached timeline are fetched, so the span's good days cost nothing
+        prefetch_location(lat, lon, timezone, cache_ns, dates[0], dates[-1], params['events'], location_auth,
+                          params['sun_provider'], fetch_concurrency)
+
+        replacements, still_degraded = {}, []
+
+        def day_done(date_str, degraded):
+            if degraded:
+                still_degraded.append(date_str)
+
+        for date in dates:
+            for date_str, day_events in location_events(location, lat, lon, timezone, cache_ns, date, date,
+                                                        params['events'], ugadi_date, location_auth,
+                                                        params['sun_provider'], panchang_provider, day_done):
+                replacements[date_str] = day_events
+
+        fixed = [day for day in days if day not in still_degraded]
+        if not fixed:
+            print(f"Nothing could be refetched for {filename}; still degraded")
+            continue
+        changed = patch_calendar_days(filename, {day: replacements[day] for day in fixed})
+        if changed is None:
+            # No manifest to patch against (e.g. the calendar was edited or deleted): rebuild it
+            print(f"{filename} can't be patched in place; regenerating it")
+            process_location(location, datetime.strptime(params['start_date'], "%Y-%m-%d"),
+                             datetime.strptime(params['end_date'], "%Y-%m-%d"), params['events'], ugadi_date,
+                             location_auth, params['sun_provider'], panchang_provider, fetch_concurrency,
+                             ledger=queue)
+            continue
+        queue.clear_degraded(filename, fixed)
+        print(f"Patched {changed} days into {filename}; {len(still_degraded)} still degraded")
+
+
+def print_queue_summary(queue):
+    counts = queue.counts()
+    print("\nQueue: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    resume_at = queue.next_runnable_at()
+    if resume_at:
+        print(f"Deferred or failed jobs resume after {datetime.fromtimestamp(resume_at).strftime('%Y-%m-%d %H:%M')}; "
+              f"rerun with --worker")
 
 
 def main():
     start_time = time.time()
 
-    # Initialize authentication - rotate auth
-    api_clients = [
-        secrets['api']['clients'][f'client{i+1}']
-        for i in range(len(secrets['api']['clients']))
-    ]
-    auth = ProkeralaAuth(api_clients)
-
     parser = argparse.ArgumentParser(description="Generate Panchangam calendars for multiple locations")
     parser.add_argument("locations", nargs='*', 
                       default=["Mason, OH"],  # Wrap in list
@@ -456,27 +1102,120 @@ def main():
     )
     parser.add_argument("--start-date", default="2025-01-01", help="Start date (YYYY-MM-DD)")
     parser.add_argument("--end-date", default="2025-01-31", help="End date (YYYY-MM-DD)")
-    parser.add_argument("--ugadi-date", default="2025-03-30", help="Ugadi date (YYYY-MM-DD)")
+    parser.add_argument("--ugadi-date", default="2025-03-30", help="Ugadi date (YYYY-MM-DD) of its year; other years use the computed Ugadi")
     parser.add_argument("--events", nargs='+', choices=['sunrise', 'noon', 'sunset'], default=['sunrise', 'sunset'], help="Events to include. Default: sunrise sunset")
+    parser.add_argument("--sun-provider", choices=SUN_PROVIDERS, default='api', help="Sunrise/sunset source: 'api' or 'local' (offline). Default: api")
+    parser.add_argument("--panchang-provider", choices=PANCHANG_PROVIDERS, default='prokerala', help="Tithi/nakshatra source: 'prokerala' or 'local' (offline). Default: prokerala")
+    parser.add_argument("--cache-backend", choices=CACHE_BACKENDS, default='pickle', help="Cache storage: 'pickle' files or one 'sqlite' database. Default: pickle")
+    parser.add_argument("--cache-flush-interval", type=float, default=FLUSH_INTERVAL, help=f"Seconds between cache writes to disk (pickle backend). Default: {FLUSH_INTERVAL}")
+    parser.add_argument("--cities-file", help="GeoNames cities dump for offline geocoding (e.g. cities15000.txt)")
+    parser.add_argument("--tz-polygons", help="timezone-boundary-builder GeoJSON for offline timezones (needs --cities-file)")
+    parser.add_argument("--http-pool-size", type=int, default=http_client.POOL_SIZE, help=f"Keep-alive connections per API host. Default: {http_client.POOL_SIZE}")
+    parser.add_argument("--queue-db", default=os.path.join(CACHE_DIR, QUEUE_DB_NAME), help="Job queue database, shareable by several workers")
+    parser.add_argument("--worker", action='store_true', help="Don't queue new jobs, only drain the queue (other options come from each job)")
+    parser.add_argument("--backfill", action='store_true', help="Refetch only the days written with fallback panchang data and patch them into their calendars")
+    parser.add_argument("--plan", action='store_true', help="Dry run: report cache coverage, API calls per provider and client, and estimated wall time")
+    parser.add_argument("--prefetch", action='store_true', help="Only warm the caches for the locations and range (no calendars written)")
+    parser.add_argument("--budget", type=int, help="With --prefetch: most API requests to send, retries included. Default: no limit")
+    parser.add_argument("--almanac", help="Precomputed almanac file: covered locations and ranges skip caches and APIs")
+    parser.add_argument("--build-almanac", metavar="FILE", help="Precompute all events for the locations and range into an almanac file (no calendars written)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes building calendars in parallel (uses the sqlite cache). Default: 1")
+    parser.add_argument("--fetch-concurrency", type=int, default=FETCH_CONCURRENCY, help="Cap on concurrent requests per API host. Default: per-host limits (Prokerala: 2 per client)")
     
     args = parser.parse_args()
-    start_date = datetime.strptime(args.start_date, "%Y-%m-%d")
-    end_date = datetime.strptime(args.end_date, "%Y-%m-%d")
-    ugadi_date = datetime.strptime(args.ugadi_date, "%Y-%m-%d")
-
-    # Create .ics file for each location
-    for location in args.locations:
-        print(f"\nProcessing {location}...")
-        process_location(
-            auth=auth,
-            location=location,
-            start_date=start_date,
-            end_date=end_date,
-            events=args.events,
-            ugadi_date=ugadi_date
-        )
-        if len(args.locations) > 1:
-            time.sleep(60)  # Rate limit protection - 1 min between locations
+
+    global run_cache, offline_resolver, almanac
+    http_client.configure(pool_size=args.http_pool_size)
+    if (args.workers > 1 or args.worker) and args.cache_backend != 'sqlite':
+        # Worker processes (and --worker runs draining one queue side by side) need one cache they
+        # can all write: a pickle file is replaced whole, so the last process to save would win
+        option = '--workers' if args.workers > 1 else '--worker'
+        print(f"{option} uses --cache-backend sqlite (import pickle caches once with: python cache_store.py migrate)")
+        args.cache_backend = 'sqlite'
+    run_cache = open_cache(args.cache_backend, CACHE_DIR, args.cache_flush_interval)
+    if args.cities_file:
+        offline_resolver = OfflineResolver(args.cities_file, args.tz_polygons)
+    if args.almanac:
+        almanac = Almanac(args.almanac)
+
+    # A pure --plan reads the caches and usage counts and writes neither
+    dry_run = args.plan and not (args.prefetch or args.build_almanac or args.worker or args.backfill)
+
+    # Initialize authentication - rotate auth
+    auth = None
+    if (args.panchang_provider == 'prokerala' or args.worker or args.backfill) and secrets.get('api', {}).get('clients'):
+        api_clients = [
+            secrets['api']['clients'][f'client{i+1}']
+            for i in range(len(secrets['api']['clients']))
+        ]
+        # Credits are counted in the queue database, shared by every run and worker using it
+        auth = ProkeralaAuth(api_clients, usage_db=args.queue_db,
+                             backoff=BackoffPolicy(RATE_LIMIT_BASE_DELAY, BACKOFF_FACTOR, RATE_LIMIT_MAX_DELAY),
+                             read_only=dry_run)
+        # Every key runs in parallel at its own rate
+        HOST_LIMITS[PROKERALA_HOST] = HostLimit(concurrency=auth.concurrency, rate=auth.requests_per_second,
+                                                burst=len(auth.clients))
+
+    if auth is None and args.panchang_provider == 'prokerala' and not (args.worker or args.backfill):
+        print(f"No Prokerala clients in {SECRETS_FILE}; use --panchang-provider local or add [api.clients]")
+        return
+
+    if args.backfill:
+        backfill(JobQueue(args.queue_db), auth, args.fetch_concurrency)
+        if auth is not None:
+            auth.report()
+        http_client.print_connection_stats()
+        return
+
+    job_ids = None
+    if not args.worker:
+        # Geocode every new location up front (Nominatim allows 1 request/second)
+        pipeline = FetchPipeline(HOST_LIMITS, args.fetch_concurrency)
+        for location in args.locations:
+            if not run_cache.get_alias(location) and (almanac is None or almanac.find(location) is None):
+                pipeline.add(NOMINATIM_HOST, resolve_location, location)
+        pipeline.run()
+
+        start_date = datetime.strptime(args.start_date, "%Y-%m-%d")
+        end_date = datetime.strptime(args.end_date, "%Y-%m-%d")
+        if args.build_almanac:
+            build_almanac(args.build_almanac, args.locations, start_date, end_date,
+                          datetime.strptime(args.ugadi_date, "%Y-%m-%d"), auth, args.sun_provider,
+                          args.panchang_provider, args.fetch_concurrency)
+            http_client.print_connection_stats()
+            return
+        if args.plan or args.prefetch:
+            if args.prefetch:
+                prefetch_run(args.locations, start_date, end_date, args.events, args.sun_provider,
+                             args.panchang_provider, auth, args.budget, args.fetch_concurrency)
+            else:
+                plan_run(args.locations, start_date, end_date, args.events, args.sun_provider,
+                         args.panchang_provider, auth)
+            http_client.print_connection_stats()
+            return
+
+    # Opened only now, so a --plan leaves no queue database behind
+    queue = JobQueue(args.queue_db)
+    if not args.worker:
+        # One job per location; a rerun of the same range picks up deferred or interrupted work
+        params = {
+            'events': args.events,
+            'ugadi_date': args.ugadi_date,
+            'sun_provider': args.sun_provider,
+            'panchang_provider': args.panchang_provider,
+        }
+        job_ids = [queue.enqueue(location, args.start_date, args.end_date, params) for location in args.locations]
+
+    # Create .ics file for each queued location (--worker: every runnable job in the queue)
+    if args.workers > 1:
+        run_queue_parallel(queue, auth, args.workers, args.cache_backend, args.cache_flush_interval,
+                           args.fetch_concurrency, job_ids)
+    else:
+        run_queue(queue, auth, args.fetch_concurrency, job_ids)
+
+    if auth is not None:
+        auth.report()
+    http_client.print_connection_stats()
 
     # Execution time calculation
     end_time = time.time()
@@ -0,0 +1,151 @@
+# [SUMMARY]:
+# Offline sunrise / sunset / solar noon calculator (NOAA solar calculator, Meeus based)
+# Works on whole date ranges and many locations at once using NumPy arrays,
+# so a full year for a location takes milliseconds and no network calls.
+# Agrees with api.sunrise-sunset.org to within about two minutes at mid latitudes.
+
+# [USAGE]:
+# from solar_ephemeris import solar_events, sunrise_sunset_range
+# events = solar_events(['2025-01-01', '2025-12-31'], [39.36], [-84.31])
+# days = sunrise_sunset_range(39.36, -84.31, '2025-01-01', '2025-12-31')
+
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# Geometric altitude of the sun's centre at sunrise/sunset (refraction + semi-diameter)
+SUN_ALTITUDE = -0.833
+UNIX_EPOCH_JD = 2440587.5
+J2000 = 2451545.0
+SECONDS_PER_DAY = 86400
+ITERATIONS = 2  # Re-evaluate the sun's position at the event time for sub-minute accuracy
+
+
+def _date_range(start_date, end_date):
+    """Inclusive array of datetime64[D] days between two dates"""
+    start = np.datetime64(str(start_date)[:10], 'D')
+    end = np.datetime64(str(end_date)[:10], 'D')
+    return np.arange(start, end + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+
+
+def _as_days(dates):
+    """Accept a (start, end) pair, a list of dates or a datetime64 array"""
+    if isinstance(dates, tuple) and len(dates) == 2:
+        return _date_range(*dates)
+    return np.asarray([str(d)[:10] for d in np.atleast_1d(dates)], dtype='datetime64[D]')
+
+
+def _mean_elements(t):
+    """Sun's mean longitude (deg), mean anomaly (rad) and node of the moon (rad)"""
+    l0 = np.mod(280.46646 + t * (36000.76983 + t * 0.0003032), 360.0)
+    m = np.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    omega = np.radians(125.04 - 1934.136 * t)
+    return l0, m, omega
+
+
+def sun_apparent_longitude(jd):
+    """Apparent tropical longitude of the sun in degrees (Meeus ch. 25, ~0.01 deg)"""
+    t = (np.asarray(jd, dtype=float) - J2000) / 36525.0
+    l0, m, omega = _mean_elements(t)
+    center = (np.sin(m) * (1.914602 - t * (0.004817 + 0.000014 * t))
+              + np.sin(2 * m) * (0.019993 - 0.000101 * t)
+              + np.sin(3 * m) * 0.000289)
+    return np.mod(l0 + center - 0.00569 - 0.00478 * np.sin(omega), 360.0)
+
+
+def _sun_position(jd):
+    """Declination (radians) and equation of time (minutes) for Julian days"""
+    t = (jd - J2000) / 36525.0
+    l0, m, omega = _mean_elements(t)
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    apparent_long = np.radians(sun_apparent_longitude(jd))
+
+    obliquity0 = 23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    obliquity = np.radians(obliquity0 + 0.00256 * np.cos(omega))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparent_long))
+
+    y = np.tan(obliquity / 2) ** 2
+    l0 = np.radians(l0)
+    eq_time = 4 * np.degrees(
+        y * np.sin(2 * l0)
+        - 2 * e * np.sin(m)
+        + 4 * e * y * np.sin(m) * np.cos(2 * l0)
+        - 0.5 * y * y * np.sin(4 * l0)
+        - 1.25 * e * e * np.sin(2 * m)
+    )
+    return declination, eq_time
+
+
+def _hour_angle(lat, declination):
+    """Sunrise hour angle in degrees, NaN when the sun never crosses the horizon"""
+    lat = np.radians(lat)
+    cos_ha = (np.cos(np.radians(90 - SUN_ALTITUDE)) / (np.cos(lat) * np.cos(declination))
+              - np.tan(lat) * np.tan(declination))
+    with np.errstate(invalid='ignore'):
+        return np.degrees(np.arccos(np.where(np.abs(cos_ha) <= 1, cos_ha, np.nan)))
+
+
+def solar_events(dates, lats, lons):
+    """Vectorized sunrise, sunset and solar noon
+
+    dates: (start, end) tuple or list of dates; lats/lons: sequences of the same length.
+    Returns a dict of float arrays shaped (n_locations, n_days) holding UTC epoch seconds
+    for 'sunrise', 'sunset' and 'solar_noon' (NaN on polar day/night), plus 'days'.
+    Times follow api.sunrise-sunset.org: events of the local solar day, expressed in UTC.
+    """
+    days = _as_days(dates)
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))[:, None]
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))[:, None]
+
+    day_seconds = days.astype('datetime64[s]').astype(np.int64)[None, :]
+    jd0 = day_seconds / SECONDS_PER_DAY + UNIX_EPOCH_JD
+
+    # Solar noon, refined at its own instant
+    noon = 720 - 4 * lons + np.zeros_like(jd0)
+    for _ in range(ITERATIONS):
+        _, eq_time = _sun_position(jd0 + noon / 1440)
+        noon = 720 - 4 * lons - eq_time
+
+    results = {'days': days, 'solar_noon': day_seconds + noon * 60}
+    for name, sign in (('sunrise', -1), ('sunset', 1)):
+        minutes = noon.copy()
+        for _ in range(ITERATIONS):
+            declination, eq_time = _sun_position(jd0 + minutes / 1440)
+            minutes = 720 - 4 * (lons - sign * _hour_angle(lats, declination)) - eq_time
+        results[name] = day_seconds + minutes * 60
+    return results
+
+
+def _iso(epoch_seconds):
+    """Epoch seconds to the API's ISO format, None for NaN"""
+    if np.isnan(epoch_seconds):
+        return None
+    return datetime.fromtimestamp(int(round(epoch_seconds)), tz=timezone.utc).isoformat()
+
+
+def sunrise_sunset_range(lat, lon, start_date, end_date):
+    """Results for every day in the range, shaped like the sunrise-sunset.org 'results' payload
+
+    Returns {date_str: {'sunrise', 'sunset', 'solar_noon', 'day_length'} or None}
+    """
+    events = solar_events((start_date, end_date), [lat], [lon])
+    results = {}
+    for i, day in enumerate(events['days']):
+        sunrise, sunset = events['sunrise'][0, i], events['sunset'][0, i]
+        if np.isnan(sunrise) or np.isnan(sunset):
+            results[str(day)] = None
+            continue
+        results[str(day)] = {
+            'sunrise': _iso(sunrise),
+            'sunset': _iso(sunset),
+            'solar_noon': _iso(events['solar_noon'][0, i]),
+            'day_length': int(round(sunset - sunrise)),
+        }
+    return results
+
+
+def get_sunrise_sunset_local(lat, lon, date):
+    """Drop-in offline replacement for a single-day sunrise-sunset.org lookup"""
+    return sunrise_sunset_range(lat, lon, date, date)[str(date)[:10]]
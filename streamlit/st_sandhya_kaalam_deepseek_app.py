@@ -11,12 +11,27 @@
 
 
 
+import os
+import sys
+
 import streamlit as st
 from datetime import datetime, timedelta
-from geopy.geocoders import Nominatim
-import requests
+import numpy as np
 import pytz
 
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from almanac import Almanac
+import http_client
+from day_table import SUN, day_strings, fill_noon, fill_sun, fill_sun_grid, new_day_table, utc_stamps
+from geocoding import get_geocoder
+from ics_writer import event_lines, format_utc, write_calendar
+from sun_grid import SunGrid
+
+NOON_MINUTES = (11 * 60 + 24, 10 * 60 + 48, 12 * 60)  # Noon midpoint, start and end, minutes after local midnight
+ALMANAC_FILE = os.environ.get('SANDHYA_ALMANAC', 'almanac.bin')
+SUN_GRID_FILE = os.environ.get('SANDHYA_SUN_GRID', 'sun_grid.npz')
+
 # Title and Credits Banner
 st.markdown(
     """
@@ -31,9 +46,17 @@ st.markdown(
 
 # Function to get timezone
 def get_timezone(lat, lon):
-    geolocator = Nominatim(user_agent="my_geocoder")
-    location = geolocator.reverse(f"{lat},{lon}", exactly_one=True)
-    return pytz.timezone(location.raw['timezone']['tzid']) if location and 'timezone' in location.raw else pytz.utc
+    return pytz.timezone(get_geocoder().timezone_name(lat, lon))
+
+# Precomputed almanac (sandhya_kaalam_panchangam.py --build-almanac), mapped once per server process
+@st.cache_resource
+def open_almanac():
+    return Almanac(ALMANAC_FILE) if os.path.exists(ALMANAC_FILE) else None
+
+# Precomputed sunrise/sunset grid (python sun_grid.py build), loaded once per server process
+@st.cache_resource
+def open_sun_grid():
+    return SunGrid.load(SUN_GRID_FILE) if os.path.exists(SUN_GRID_FILE) else None
 
 # Function to get sunrise and sunset data
 def get_sunrise_sunset_month(lat, lon, year, month):
@@ -46,101 +69,95 @@ def get_sunrise_sunset_month(lat, lon, year, month):
     )
     
     url = f"https://api.sunrise-sunset.org/json?lat={lat}&lng={lon}&formatted=0&start={start_date.strftime('%Y-%m-%d')}&end={end_date.strftime('%Y-%m-%d')}"
-    response = requests.get(url)
+    response = http_client.get(url)  # Pooled keep-alive session shared across reruns
     
     if response.status_code == 200 and response.json()["status"] == "OK":
         return response.json()["results"]  # Directly return the list of daily data
     st.error(f"Error fetching data for {year}-{month:02d}")
     return None
 
-# Function to generate .ics file content
+# Function to generate .ics file content: an iterator of events, streamed by write_calendar
 def generate_ics_content(location, start_date, end_date, events):
-    geolocator = Nominatim(user_agent="my_geocoder")
-    location_data = geolocator.geocode(location)
+    # Locations and ranges in the almanac are sliced from the map: no geocoding or API calls
+    book = open_almanac()
+    index = book.find(location) if book is not None else None
+    table = book.day_table(index, start_date, end_date) if index is not None else None
+    if table is not None:
+        if 'noon' in events and book.noon_minutes != NOON_MINUTES:
+            table = np.array(table)  # Mapped rows are read-only; this app's noon window differs
+            fill_noon(table, book.locations[index]['tz'], NOON_MINUTES)
+        return ics_events(location, table, events)
+
+    location_data = get_geocoder().geocode(location)
 
     if not location_data:
         st.error("The location is not found. Please enter City, State or City, State, Country format (e.g., Mason, OH).")
         return None
 
-    lat, lon = location_data.latitude, location_data.longitude
-    timezone = get_timezone(lat, lon)
-    local_tz = timezone
-
-    ics_content = "BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:-//Sunrise Sunset Calendar//EN\n"
-
-    # Process sunrise and sunset events
-    if 'sunrise' in events or 'sunset' in events:
+    lat, lon = location_data
+    return ics_events(location, sun_day_table(lat, lon, get_timezone(lat, lon), start_date, end_date, events), events)
+
+def sun_day_table(lat, lon, local_tz, start_date, end_date, events):
+    """Day table with the events' times; sunrise/sunset comes from the sun grid, else is fetched one month per request"""
+    table = new_day_table(start_date, end_date)
+    grid = open_sun_grid()
+    if grid is not None and ('sunrise' in events or 'sunset' in events):
+        fill_sun_grid(table, grid, lat, lon)
+    elif 'sunrise' in events or 'sunset' in events:
+        sun_days = {}
         current_month = start_date.replace(day=1)
         end_month = end_date.replace(day=1)
         while current_month <= end_month:
             year = current_month.year
             month = current_month.month
             data = get_sunrise_sunset_month(lat, lon, year, month)
-            if data:
-                for idx, daily_data in enumerate(data):
-                    day_date = (datetime(year, month, 1) + timedelta(days=idx)).date()
-                    if start_date.date() <= day_date <= end_date.date():
-                        sunrise_time = datetime.fromisoformat(daily_data["sunrise"])
-                        sunset_time = datetime.fromisoformat(daily_data["sunset"])
-
-                        if 'sunrise' in events:
-                            sunrise_start = sunrise_time - timedelta(hours=1, minutes=12)
-                            sunrise_end = sunrise_time + timedelta(minutes=48)
-                            ics_content += generate_event(
-                                sunrise_start, sunrise_end, "ప్రాతః సంధ్యా సమయం", location, 
-                                day_date.strftime("%Y-%m-%d"), "sunrise"
-                            )
-
-                        if 'sunset' in events:
-                            sunset_start = sunset_time - timedelta(minutes=24)
-                            sunset_end = sunset_time + timedelta(hours=1, minutes=12)
-                            ics_content += generate_event(
-                                sunset_start, sunset_end, "సాయం సంధ్యా సమయం", location,
-                                day_date.strftime("%Y-%m-%d"), "sunset"
-                            )
+            for idx, daily_data in enumerate(data or []):
+                sun_days[(datetime(year, month, 1) + timedelta(days=idx)).strftime("%Y-%m-%d")] = daily_data
             current_month = (current_month.replace(day=28) + timedelta(days=4)).replace(day=1)
+        fill_sun(table, sun_days)
+    if 'noon' in events:
+        fill_noon(table, local_tz.zone, NOON_MINUTES)
+    return table
+
+def ics_events(location, table, events):
+    # The server outlives many downloads, so each calendar gets its own DTSTAMP
+    dtstamp = format_utc(datetime.now(pytz.utc))
+    dates = day_strings(table)
+
+    # Process sunrise and sunset events
+    windows = [
+        (event, summary, utc_stamps(table[event] + before), utc_stamps(table[event] + after))
+        for event, summary, before, after in (
+            ('sunrise', "ప్రాతః సంధ్యా సమయం", -72 * 60, 48 * 60),
+            ('sunset', "సాయం సంధ్యా సమయం", -24 * 60, 72 * 60),
+        ) if event in events
+    ]
+    if windows:
+        has_sun = (table['valid'] & SUN).tolist()
+        for i, date_str in enumerate(dates):
+            if has_sun[i]:
+                for event, summary, starts, ends in windows:
+                    yield generate_event(starts[i], ends[i], summary, location, date_str, event, dtstamp)
 
     # Process noon events
     if 'noon' in events:
-        current_day = start_date.date()
-        end_day = end_date.date()
-        delta = timedelta(days=1)
-        while current_day <= end_day:
-            noon_start_naive = datetime.combine(current_day, datetime.strptime("10:48", "%H:%M").time())
-            noon_end_naive = datetime.combine(current_day, datetime.strptime("12:00", "%H:%M").time())
-            noon_start = local_tz.localize(noon_start_naive).astimezone(pytz.utc)
-            noon_end = local_tz.localize(noon_end_naive).astimezone(pytz.utc)
-            ics_content += generate_event(
-                noon_start, noon_end, "మాధ్యానిక సంధ్యా సమయం", location, current_day.strftime("%Y-%m-%d"), "noon"
-            )
-            current_day += delta
-
-    ics_content += "END:VCALENDAR"
-    return ics_content
+        starts, ends = utc_stamps(table['noon_start']), utc_stamps(table['noon_end'])
+        for date_str, noon_start, noon_end in zip(dates, starts, ends):
+            yield generate_event(noon_start, noon_end, "మాధ్యానిక సంధ్యా సమయం", location, date_str, "noon", dtstamp)
 
 # Function to generate an event in .ics format
-def generate_event(start_time, end_time, summary, location, day_str, event_type):
-    event = [
-        "BEGIN:VEVENT",
-        f"UID:{start_time.strftime('%Y%m%dT%H%M%S')}@{event_type}",
-        f"DTSTAMP:{datetime.now().strftime('%Y%m%dT%H%M%SZ')}",
-        f"DTSTART:{start_time.strftime('%Y%m%dT%H%M%SZ')}",
-        f"DTEND:{end_time.strftime('%Y%m%dT%H%M%SZ')}",
-        f"SUMMARY:{summary} at {location}",
-        f"DESCRIPTION:{summary} at {location} on {day_str}.",
-        "BEGIN:VALARM",
-        "TRIGGER:-PT15M",
-        "ACTION:DISPLAY",
-        f"DESCRIPTION:Reminder: {summary} in 15 minutes.",
-        "END:VALARM",
-        "BEGIN:VALARM",
-        "TRIGGER:PT0M",
-        "ACTION:DISPLAY",
-        f"DESCRIPTION:Reminder: {summary} is starting now.",
-        "END:VALARM",
-        "END:VEVENT\n"
-    ]
-    return "\n".join(event) + "\n"
+def generate_event(start_time, end_time, summary, location, day_str, event_type, dtstamp):
+    return event_lines(
+        f"{start_time[:-1]}@{event_type}",  # start_time is a UTC stamp (day_table.utc_stamps)
+        start_time, end_time,
+        f"{summary} at {location}",
+        f"{summary} at {location} on {day_str}.",
+        alarms=[
+            ('-PT15M', f"Reminder: {summary} in 15 minutes."),
+            ('PT0M', f"Reminder: {summary} is starting now."),
+        ],
+        dtstamp=dtstamp
+    )
 
 # Streamlit UI
 st.sidebar.header("User Inputs")
@@ -167,18 +184,18 @@ events = st.sidebar.multiselect("Select Events:", ["sunrise", "noon", "sunset"],
 
 # Generate .ics File
 if st.sidebar.button("Generate .ics File"):
-    ics_content = generate_ics_content(location, start_date, end_date, events)
-    if ics_content:
+    ics_events_iter = generate_ics_content(location, start_date, end_date, events)
+    if ics_events_iter is not None:
         filename = f"{location.replace(' ', '_').replace(',', '')}_sandhya_kaalam_{year}.ics"
-        with open(filename, "w") as ics_file:
-            ics_file.write(ics_content)
+        write_calendar(filename, ics_events_iter)
         st.success(f"Successfully created .ics file. Check your downloads folder for '{filename}'.")
-        st.download_button(
-            label="Download .ics File",
-            data=ics_content,
-            file_name=filename,
-            mime="text/calendar"
-        )
+        with open(filename, "rb") as ics_file:
+            st.download_button(
+                label="Download .ics File",
+                data=ics_file,
+                file_name=filename,
+                mime="text/calendar"
+            )
 
 # Message Box at the Bottom
 st.markdown(
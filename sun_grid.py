@@ -0,0 +1,170 @@
+# [SUMMARY]:
+# Precomputed sunrise / sunset grid with bilinear interpolation, for arbitrary coordinates
+# solar_events() is run once for a lat/lon grid and every day of a span of years; a new
+# place is then answered from memory by blending its cell's four corners, with no
+# ephemeris iterations or API calls, in the same time for any coordinate.
+# The grid stores each event as local mean solar time (UTC time of day + 4 min per degree
+# of east longitude), which takes out the big longitude term: what is left varies with
+# longitude only through the sun's motion during the day, so longitude needs few columns.
+# Values are int16 seconds from 06:00 / 18:00, one slot per day of year (366).
+# Error against solar_events() for the default grid (0.25 deg latitude, 60 deg longitude),
+# measured with `python sun_grid.py check` over 2025-2030: about 1 s up to 60 deg latitude
+# and 11 s at most between 60 deg and LAT_LIMIT (p99 3 s), well inside the ~2 minutes
+# solar_events() itself is good for. Beyond LAT_LIMIT (polar day/night, fast-changing
+# day length), on days outside the grid's years or next to a grid point without an
+# event, the exact solar_events() result is used instead. Lookups take ~50 us a day and
+# ~130 us a year, against ~0.7 / 1.4 ms for solar_events().
+
+# [USAGE]:
+# python sun_grid.py build sun_grid.npz 2025 2030    # ~3 s and ~5 MB per year
+# python sun_grid.py check sun_grid.npz
+# grid = SunGrid.load('sun_grid.npz')
+# sunrise, sunset = grid.events(39.36, -84.31, '2025-01-01', '2025-12-31')  # epoch seconds, NaN when none
+# fill_sun_grid(table, grid, 39.36, -84.31)  # day_table.py
+
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from solar_ephemeris import solar_events
+
+
+LAT_STEP = 0.25
+LON_STEP = 60.0
+LAT_LIMIT = 65.0   # Interpolated up to here, exact beyond
+EVENTS = ('sunrise', 'sunset')
+BASES = (6 * 3600, 18 * 3600)  # Stored seconds are relative to 06:00 / 18:00 local mean time
+NO_EVENT = np.iinfo(np.int16).min
+
+
+def _days(start_date, end_date):
+    start = np.datetime64(str(start_date)[:10], 'D')
+    end = np.datetime64(str(end_date)[:10], 'D')
+    return np.arange(start, end + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+
+
+class SunGrid:
+    """Sunrise/sunset of every grid point and day of a span of years
+
+    seconds: int16 array shaped (years, events, lats, lons, 366).
+    """
+
+    def __init__(self, first_year, seconds, lat_step=LAT_STEP, lon_step=LON_STEP, lat_limit=LAT_LIMIT):
+        self.first_year = int(first_year)
+        self.seconds = seconds
+        self.lat_step = float(lat_step)
+        self.lon_step = float(lon_step)
+        self.lat_limit = float(lat_limit)
+        self.last_year = self.first_year + seconds.shape[0] - 1
+
+    @classmethod
+    def build(cls, first_year, last_year, lat_step=LAT_STEP, lon_step=LON_STEP, lat_limit=LAT_LIMIT):
+        """Run solar_events() over the grid for every day of the years"""
+        lats = np.linspace(-lat_limit, lat_limit, int(round(2 * lat_limit / lat_step)) + 1)
+        lons = np.linspace(-180.0, 180.0, int(round(360 / lon_step)) + 1)
+        grid_lats, grid_lons = (a.ravel() for a in np.meshgrid(lats, lons, indexing='ij'))
+        seconds = np.full((last_year - first_year + 1, len(EVENTS), len(lats), len(lons), 366),
+                          NO_EVENT, dtype=np.int16)
+        for y, year in enumerate(range(first_year, last_year + 1)):
+            results = solar_events((f'{year}-01-01', f'{year}-12-31'), grid_lats, grid_lons)
+            midnights = results['days'].astype('datetime64[s]').astype(np.int64)
+            for e, (event, base) in enumerate(zip(EVENTS, BASES)):
+                local = results[event] - midnights + 240 * grid_lons[:, None] - base
+                found = ~np.isnan(local)
+                values = np.full(local.shape, NO_EVENT, dtype=np.int16)
+                values[found] = np.round(local[found])
+                seconds[y, e, :, :, :len(midnights)] = values.reshape(len(lats), len(lons), -1)
+        return cls(first_year, seconds, lat_step, lon_step, lat_limit)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['first_year'], data['seconds'], data['lat_step'], data['lon_step'], data['lat_limit'])
+
+    def save(self, path):
+        """Write the grid as an uncompressed .npz (atomic replace)"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, seconds=self.seconds, first_year=self.first_year, lat_step=self.lat_step,
+                         lon_step=self.lon_step, lat_limit=self.lat_limit)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def events(self, lat, lon, start_date, end_date):
+        """Sunrise and sunset (float UTC epoch seconds, NaN on polar day/night) for every day of a range"""
+        days = _days(start_date, end_date)
+        midnights = days.astype('datetime64[s]').astype(np.int64)
+        sunrise = np.full(len(days), np.nan)
+        sunset = np.full(len(days), np.nan)
+        exact = np.ones(len(days), dtype=bool)
+
+        if abs(lat) <= self.lat_limit:
+            years = days.astype('datetime64[Y]')
+            year_index = years.astype(int) + 1970 - self.first_year
+            inside = (year_index >= 0) & (year_index < self.seconds.shape[0])
+            doy = (days - years.astype('datetime64[D]')).astype(int)
+
+            # The cell holding the coordinate and the position inside it
+            fi = (lat + self.lat_limit) / self.lat_step
+            i = min(int(fi), self.seconds.shape[2] - 2)
+            fj = (lon + 180.0) / self.lon_step
+            j = min(int(fj), self.seconds.shape[3] - 2)
+            fy, fx = fi - i, fj - j
+            weights = np.array([[(1 - fy) * (1 - fx), (1 - fy) * fx], [fy * (1 - fx), fy * fx]])
+
+            corners = self.seconds[:, :, i:i + 2, j:j + 2, :][year_index[inside], :, :, :, doy[inside]]
+            blended = (corners * weights).sum(axis=(2, 3))  # (days inside, events)
+            found = (corners != NO_EVENT).all(axis=(1, 2, 3))
+            rows = np.flatnonzero(inside)[found]
+            for e, (out, base) in enumerate(zip((sunrise, sunset), BASES)):
+                out[rows] = midnights[rows] + base + blended[found, e] - 240 * lon
+            exact[rows] = False
+
+        if exact.any():
+            results = solar_events(days[exact], [lat], [lon])
+            sunrise[exact] = results['sunrise'][0]
+            sunset[exact] = results['sunset'][0]
+        return sunrise, sunset
+
+
+def check(grid, samples=2000, seed=1):
+    """Largest and 99th-percentile error (seconds) against solar_events() per latitude band"""
+    rng = np.random.default_rng(seed)
+    start, end = f'{grid.first_year}-01-01', f'{grid.last_year}-12-31'
+    bands = [(0.0, 30.0), (30.0, 45.0), (45.0, 60.0), (60.0, grid.lat_limit)]
+    for low, high in bands:
+        lats = rng.uniform(low, high, samples) * rng.choice([-1, 1], samples)
+        lons = rng.uniform(-180, 180, samples)
+        exact = solar_events((start, end), lats, lons)
+        errors = []
+        for k in range(samples):
+            sunrise, sunset = grid.events(lats[k], lons[k], start, end)
+            errors.append(np.abs(sunrise - exact['sunrise'][k]))
+            errors.append(np.abs(sunset - exact['sunset'][k]))
+        errors = np.concatenate(errors)
+        print(f"|lat| {low:4.1f}-{high:4.1f}: max {np.nanmax(errors):5.1f} s, "
+              f"p99 {np.nanpercentile(errors, 99):5.1f} s")
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == 'build':
+        started = time.time()
+        grid = SunGrid.build(int(sys.argv[3]), int(sys.argv[4]))
+        grid.save(sys.argv[2])
+        print(f"{sys.argv[2]}: {grid.first_year}-{grid.last_year}, {grid.seconds.nbytes:,} bytes "
+              f"in {time.time() - started:.1f}s")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'check':
+        check(SunGrid.load(sys.argv[2]))
+    else:
+        print("Usage: python sun_grid.py build sun_grid.npz FIRST_YEAR LAST_YEAR | check sun_grid.npz")
+
+
+if __name__ == "__main__":
+    main()
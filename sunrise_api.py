@@ -0,0 +1,68 @@
+# [SUMMARY]:
+# sunrise-sunset.org range client with caching
+# Fetches a whole month per request with the API's start/end range form (as prototyped in
+# sandbox/get_local_sandhya_kaalam_deepseek_ical_year_args.py and the Streamlit app),
+# and stores every day through the cache_store backends under the 'sunrise' cache type.
+# A year is ~12 requests on the first run and zero on a rerun.
+
+# [USAGE]:
+# days = get_sunrise_sunset_days(run_cache, cache_ns, 39.3601, -84.3099, '2025-01-01', '2025-12-31')
+# days['2025-01-29']['sunrise']  # '2025-01-29T12:44:59+00:00'
+
+
+from datetime import date, timedelta
+
+import http_client
+
+
+SUNRISE_API_URL = "https://api.sunrise-sunset.org/json"
+REQUEST_TIMEOUT = 30
+
+
+def _as_date(value):
+    return value if type(value) is date else date.fromisoformat(str(value)[:10])
+
+
+def month_chunks(start_date, end_date):
+    """(first, last) date pairs per calendar month, clipped to the range"""
+    current, end = _as_date(start_date), _as_date(end_date)
+    while current <= end:
+        next_month = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        yield current, min(end, next_month - timedelta(days=1))
+        current = next_month
+
+
+def fetch_sunrise_sunset_range(lat, lon, start_date, end_date):
+    """One API request for a date range, returned as {date_str: results}"""
+    start, end = _as_date(start_date), _as_date(end_date)
+    response = http_client.get(SUNRISE_API_URL, params={
+        'lat': lat, 'lng': lon, 'formatted': 0,
+        'start': start.isoformat(), 'end': end.isoformat()
+    }, timeout=REQUEST_TIMEOUT)
+
+    if response.status_code != 200 or response.json().get("status") != "OK":
+        print(f"Error fetching data for {start} to {end}")
+        return {}
+
+    results = response.json()["results"]
+    if isinstance(results, dict) and 'sunrise' in results:
+        results = [results]  # Single day
+    if isinstance(results, dict):
+        return {str(day)[:10]: data for day, data in results.items()}
+    days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    return {data.get('date', day)[:10]: data for day, data in zip(days, results)}
+
+
+def get_sunrise_sunset_days(cache, cache_ns, lat, lon, start_date, end_date):
+    """Sunrise/sunset results for every day in the range, fetching only months with misses"""
+    days = {}
+    for first, last in month_chunks(start_date, end_date):
+        month_days = [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+        cached = {day: cache.get(cache_ns, 'sunrise', (round(lat, 4), round(lon, 4), day)) for day in month_days}
+        if any(data is None for data in cached.values()):
+            for day, data in fetch_sunrise_sunset_range(lat, lon, first, last).items():
+                if day in cached:
+                    cached[day] = data
+                    cache.put(cache_ns, 'sunrise', (round(lat, 4), round(lon, 4), day), data)
+        days.update(cached)
+    return days
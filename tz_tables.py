@@ -0,0 +1,107 @@
+# [SUMMARY]:
+# Precomputed UTC-offset transition tables for vectorized local -> UTC conversion
+# Each zone's transitions (pytz's compiled tzfile data) become NumPy arrays once per run;
+# converting a wall-clock time for every day of a range is then one searchsorted and a
+# subtraction instead of a localize() + astimezone() per day.
+# DST edges are explicit: an ambiguous wall time (clocks fall back, it happens twice) and
+# a nonexistent one (clocks spring forward over it) resolve to the 'standard' or 'dst'
+# reading, or 'raise'. The defaults give the same instants as pytz's localize().
+
+# [USAGE]:
+# table = transition_table('America/New_York')
+# utc = table.to_utc(local_seconds)  # int64 epoch seconds; local_seconds = wall time as if it were UTC
+# noon = daily_utc('America/New_York', '2025-01-01', '2025-12-31', [11 * 60 + 24])  # shape (365, 1)
+# utc_datetimes(noon[:, 0])  # [datetime(2025, 1, 1, 16, 24, tzinfo=<UTC>), ...]
+
+
+import functools
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytz
+
+
+POLICIES = ('standard', 'dst', 'raise')
+_EPOCH = datetime(1970, 1, 1)
+_FAR_PAST = -(2 ** 62)    # Start of the first interval
+_FAR_FUTURE = 2 ** 62     # End of the last interval
+
+
+class TransitionTable:
+    """A zone's UTC offsets as arrays: interval i starts at transitions[i] (UTC) with offsets[i]"""
+
+    def __init__(self, tz):
+        self.zone = tz.zone
+        if hasattr(tz, '_utc_transition_times'):
+            times = [int((t - _EPOCH).total_seconds()) for t in tz._utc_transition_times]
+            info = tz._transition_info
+        else:
+            # Fixed-offset zone (UTC, Etc/GMT+5, ...)
+            offset = tz.utcoffset(datetime(2000, 1, 1))
+            times, info = [_FAR_PAST], [(offset, offset - offset, tz.tzname(datetime(2000, 1, 1)))]
+        times[0] = _FAR_PAST
+        self.transitions = np.array(times, dtype=np.int64)
+        self.offsets = np.array([int(utcoffset.total_seconds()) for utcoffset, _, _ in info], dtype=np.int64)
+        self.is_dst = np.array([bool(dst) for _, dst, _ in info])
+        self._next = np.append(self.transitions[1:], _FAR_FUTURE)
+        self._local_starts = self.transitions + self.offsets
+
+    def to_utc(self, local_seconds, ambiguous='standard', nonexistent='standard'):
+        """UTC epoch seconds for wall-clock times given as epoch seconds of the naive local time
+
+        ambiguous / nonexistent: 'standard' or 'dst' resolve like localize(is_dst=False / True),
+        'raise' raises pytz.AmbiguousTimeError / pytz.NonExistentTimeError.
+        """
+        if ambiguous not in POLICIES or nonexistent not in POLICIES:
+            raise ValueError(f"ambiguous and nonexistent must be one of {POLICIES}")
+        local = np.asarray(local_seconds, dtype=np.int64)
+        j = np.maximum(np.searchsorted(self._local_starts, local, side='right') - 1, 0)
+        utc = local - self.offsets[j]
+
+        # Spring forward: the wall time is past interval j's end but before j + 1 starts locally
+        gap = local >= self._next[j] + self.offsets[j]
+        # Fall back: the wall time is also before interval j - 1's local end
+        prev = np.maximum(j - 1, 0)
+        fold = (j > 0) & (local < self.transitions[j] + self.offsets[prev])
+
+        for mask, policy, error in ((gap, nonexistent, pytz.NonExistentTimeError),
+                                    (fold, ambiguous, pytz.AmbiguousTimeError)):
+            if mask.any() and policy == 'raise':
+                raise error(f"{_EPOCH + timedelta(seconds=int(local[mask].flat[0]))} in {self.zone}")
+
+        # The same choices as localize(is_dst=False / True):
+        # nonexistent reads the wall time with the offset before / after the transition,
+        # ambiguous takes the one reading whose DST flag matches, else the later / earlier instant
+        want_dst = ambiguous == 'dst'
+        if gap.any():
+            after = np.minimum(j + 1, len(self.offsets) - 1)  # Only entries inside the gap matter
+            utc = np.where(gap, local - self.offsets[j if nonexistent == 'standard' else after], utc)
+        if fold.any():
+            earlier_matches = self.is_dst[prev] == want_dst
+            later_matches = self.is_dst[j] == want_dst
+            use_earlier = np.where(earlier_matches != later_matches, earlier_matches, want_dst)
+            utc = np.where(fold & use_earlier, local - self.offsets[prev], utc)
+        return utc
+
+
+@functools.lru_cache(maxsize=None)
+def transition_table(zone):
+    """Shared TransitionTable per zone name, built on first use"""
+    return TransitionTable(pytz.timezone(zone))
+
+
+def daily_utc(zone, start_date, end_date, minutes, ambiguous='standard', nonexistent='standard'):
+    """UTC epoch seconds of local wall times (minutes after midnight) on every day of a range
+
+    Returns an int64 array of shape (days, len(minutes)).
+    """
+    start = np.datetime64(str(start_date)[:10], 'D')
+    end = np.datetime64(str(end_date)[:10], 'D')
+    days = np.arange(start, end + np.timedelta64(1, 'D'), dtype='datetime64[D]').astype(np.int64)
+    local = days[:, None] * 86400 + np.asarray(minutes, dtype=np.int64)[None, :] * 60
+    return transition_table(zone).to_utc(local, ambiguous, nonexistent)
+
+
+def utc_datetimes(seconds):
+    """Aware UTC datetimes for an array of epoch seconds"""
+    return [datetime.fromtimestamp(s, pytz.utc) for s in np.asarray(seconds).tolist()]